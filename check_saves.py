@@ -0,0 +1,100 @@
+"""
+Checks that checkpoint saves send only the values that changed.
+
+Drives the storage stack the game uses by default (see
+storage.open_local_storage()): the journal in front of delta saves,
+with a temporary SQLite database as the backend. A savegame is created,
+then saved at a few checkpoints, as save_game() would. Fails (with exit
+status 1) if any checkpoint sends positions of the row that didn't
+change, leaves out ones that did, or isn't stored.
+
+Usage: python3 check_saves.py [--checkpoints N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from savedata import GAME_DEFAULTS, values_to_row
+from storage import base_backend, open_local_storage, row_changes
+
+# Seconds to wait for each save to be sent.
+TIMEOUT = 10
+
+
+def record_batches(backend):
+    """
+    Returns a list to which each batch that backend writes is added.
+    """
+    batches = []
+    write_batch = backend.write_batch
+
+    def recorded(changes):
+        batches.append(changes)
+        write_batch(changes)
+
+    backend.write_batch = recorded
+    return batches
+
+
+def run_checkpoints(storage, batches, checkpoints):
+    """
+    Saves a new game at each checkpoint, returning the problems found.
+    """
+    game = dict(GAME_DEFAULTS, name="Checker")
+    row = values_to_row(game, False)
+    storage.create(row)
+    if not storage.flush(TIMEOUT):
+        return ["The new savegame wasn't sent."]
+    problems = []
+    for checkpoint in range(1, checkpoints + 1):
+        game["checkpoint"] = checkpoint
+        game["information"] += checkpoint % 2
+        last_row, row = row, values_to_row(game, False)
+        del batches[:]
+        storage.write(game["name"], row)
+        if not storage.flush(TIMEOUT):
+            problems.append(f"Checkpoint {checkpoint} wasn't sent.")
+            continue
+        expected = sorted(row_changes(last_row, row))
+        sent = sorted(position for batch in batches
+                      for position in batch.get(game["name"], {}))
+        print(f"Checkpoint {checkpoint}: sent positions {sent}")
+        if sent != expected:
+            problems.append(f"Checkpoint {checkpoint} sent positions "
+                            f"{sent}, but only {expected} changed.")
+    stored = storage.read(game["name"])
+    if row_changes(stored, row):
+        problems.append(f"The stored savegame is {stored}, not {row}.")
+    return problems
+
+
+def main():
+    """
+    Saves a game through the default storage stack, and checks each save.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--checkpoints", type=int, default=3,
+                        help="checkpoints to save")
+    options = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            "SAVE_BACKEND": "sqlite",
+            "SAVE_DB": os.path.join(directory, "savegames.db"),
+            "SAVE_JOURNAL": os.path.join(directory, "savegames.journal"),
+        })
+        storage = open_local_storage()
+        batches = record_batches(base_backend(storage))
+        try:
+            problems = run_checkpoints(storage, batches, options.checkpoints)
+        finally:
+            storage.close()
+            base_backend(storage).close()
+    for problem in problems:
+        print(problem)
+    print("Only changed values were sent." if not problems else "Failed.")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Checks that run.py still starts quickly.
+
+Imports run.py in a fresh interpreter with "python3 -X importtime",
+and reports the slowest imports. Fails (with exit status 1) if:
+  - importing run.py takes longer than the budget, or
+  - any of DEFERRED_MODULES was imported. These are slow to import,
+    and are only needed once a player starts a game (see storage.py).
+
+Usage: python3 check_startup.py [--budget MS] [--runs N]
+The fastest of the runs is used, as the others are slowed by
+whatever else the machine was doing.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Modules that must not be imported until the savegame system is used.
+DEFERRED_MODULES = ("gspread", "google.auth", "google.oauth2", "requests")
+
+
+def measure():
+    """
+    Returns {module: (self_us, cumulative_us)} for one import of run.py.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import run"],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    """
+    Measures the import of run.py, reports on it, and checks the budget.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--budget", type=float, default=150,
+                        help="milliseconds allowed for importing run.py")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="times to import run.py")
+    parser.add_argument("--top", type=int, default=10,
+                        help="slowest imports to list")
+    options = parser.parse_args()
+    runs = [measure() for _ in range(options.runs)]
+    times = min(runs, key=lambda run_times: run_times["run"][1])
+    print("Slowest imports (ms, self):")
+    slowest = sorted(times.items(), key=lambda item: -item[1][0])
+    for module, (self_us, _) in slowest[:options.top]:
+        print(f"  {self_us / 1000:7.1f}  {module}")
+    total_ms = times["run"][1] / 1000
+    print(f"run.py imported in {total_ms:.1f} ms "
+          f"(budget {options.budget:.0f} ms).")
+    failed = total_ms > options.budget
+    if failed:
+        print("Over budget.")
+    for module in times:
+        if module.startswith(DEFERRED_MODULES):
+            print(f"{module} is imported at startup, but should be deferred.")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
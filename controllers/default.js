@@ -1,5 +1,13 @@
 const Pty = require('node-pty');
 const fs = require('fs');
+const childProcess = require('child_process');
+
+// Every game session passes its saves to one save daemon,
+// so Google is only authorized once per server (see save_daemon.py).
+process.env.SAVE_DAEMON_SOCKET = process.env.SAVE_DAEMON_SOCKET || 'savegames.sock';
+// Game sessions are forked from one preloaded zygote (run.py --zygote),
+// rather than each starting Python and importing everything itself.
+process.env.ZYGOTE_SOCKET = process.env.ZYGOTE_SOCKET || 'zygote.sock';
 
 exports.install = function () {
 
@@ -16,7 +24,8 @@ function socket() {
     this.on('open', function (client) {
 
         // Spawn terminal
-        client.tty = Pty.spawn('python3', ['run.py'], {
+        // zygote_client.py runs run.py itself if the zygote is down.
+        client.tty = Pty.spawn('python3', ['-S', 'zygote_client.py'], {
             name: 'xterm-color',
             cols: 80,
             rows: 24,
@@ -38,8 +47,17 @@ function socket() {
 
     this.on('close', function (client) {
         if (client.tty) {
-            client.tty.kill(9);
+            var tty = client.tty;
             client.tty = null;
+            // SIGHUP lets the game send its queued saves before exiting.
+            // If it's still running after 10 seconds, it's killed outright.
+            var killTimer = setTimeout(function () {
+                tty.kill('SIGKILL');
+            }, 10000);
+            tty.on('exit', function () {
+                clearTimeout(killTimer);
+            });
+            tty.kill('SIGHUP');
             console.log("Process killed and terminal unloaded");
         }
     });
@@ -49,6 +67,27 @@ function socket() {
     });
 }
 
+// Starts a long-lived Python service, restarting it if it exits.
+// Game sessions work without either service while it's down.
+function startService(name, args) {
+    var service = childProcess.spawn('python3', args, {
+        cwd: process.env.PWD,
+        env: process.env,
+        stdio: 'inherit'
+    });
+    service.on('exit', function (code, signal) {
+        console.log(name + " exited (" + (signal || code) + "), restarting.");
+        setTimeout(function () {
+            startService(name, args);
+        }, 1000);
+    });
+}
+
+function startServices() {
+    startService("Save daemon", ['save_daemon.py']);
+    startService("Zygote", ['run.py', '--zygote']);
+}
+
 if (process.env.CREDS != null) {
     console.log("Creating creds.json file.");
     fs.writeFile('creds.json', process.env.CREDS, 'utf8', function (err) {
@@ -56,5 +95,8 @@ if (process.env.CREDS != null) {
             console.log('Error writing file: ', err);
             socket.emit("console_output", "Error saving credentials: " + err);
         }
+        startServices();
     });
+} else {
+    startServices();
 }
\ No newline at end of file
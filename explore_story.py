@@ -0,0 +1,258 @@
+"""
+Explores every path through the story, reporting where they can end.
+
+Starting from a checkpoint (by default, the start of a new game),
+every answer to every choice is tried, until the story ends or reaches
+the --until checkpoint. Paths that reach the same state (the same node,
+"game" dictionary and scene variables) share the rest of their
+exploration, through a transposition table of the states explored.
+The first few choices are explored here, then the subtrees they lead to
+are shared out among a pool of worker processes.
+
+Each end state is reported with its stats, the other values of "game"
+that changed, the number of paths that reach it, and one such path
+(the answers to give to each choice, in order).
+
+Usage: python3 explore_story.py [--from SCENE] [--until SCENE] [--workers N]
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from savedata import GAME_DEFAULTS
+from story import (checkpoint_node, choose, live_vars, open_story, options,
+                   run)
+
+# The stats reported first for each end state, and by the other story tools.
+STATS = ("information", "legitimacy", "trust_gov", "trust_pref")
+
+# What each worker process explores: the story, where to stop,
+# and the scene variables that matter at each node (see explore_context()).
+WORKER = {}
+
+
+def explore_context(until):
+    """
+    Returns what exploration needs: the whole story, and where to stop.
+
+    Exploration stops at checkpoint until, if given, or the story's end.
+    "live" holds the scene variables still to be read at each node.
+    Two states that differ only in other variables play out alike.
+    """
+    story = open_story().load_all()
+    stops = ()
+    if until is not None:
+        stops = frozenset([checkpoint_node(story, until)])
+    return {"story": story, "stops": stops, "live": live_vars(story)}
+
+
+def freeze(context, node_id, game, scene_vars):
+    """
+    Returns a state as a key for the transposition table.
+    """
+    live = context["live"][node_id]
+    return (node_id, tuple(sorted(game.items())),
+            tuple(sorted(item for item in scene_vars.items()
+                         if item[0] in live)))
+
+
+def answers(context, node_id, game, scene_vars):
+    """
+    Yields (answer, node, game, vars) for each answer to the choice at node.
+
+    The story is run on from each answer to the next choice,
+    the end of the story, or a stop. The given state is unchanged.
+    """
+    story = context["story"]
+    for number in range(1, len(options(story, node_id)) + 1):
+        answer = str(number)
+        next_game = dict(game)
+        next_vars = dict(scene_vars)
+        next_id = choose(story, node_id, answer, next_vars)
+        next_id = run(story, next_id, next_game, next_vars,
+                      stops=context["stops"])
+        yield answer, next_id, next_game, next_vars
+
+
+def add_end(ends, game, paths, path):
+    """
+    Records that paths more paths end with game, the first being path.
+    """
+    end = tuple(sorted(game.items()))
+    if end in ends:
+        ends[end] = (ends[end][0] + paths, ends[end][1])
+    else:
+        ends[end] = (paths, path)
+
+
+def explore(context, state, table):
+    """
+    Returns {end: (paths, path)} for every end reachable from state.
+
+    A state is (node, game, vars), at a choice. An end is the final
+    "game" dictionary, as sorted items, reached by that many paths
+    (of which path is one). Results are kept in table, by state,
+    so a state reached again isn't explored again.
+    """
+    key = freeze(context, *state)
+    if key in table:
+        return table[key]
+    ends = {}
+    for answer, node_id, game, scene_vars in answers(context, *state):
+        if node_id is None or node_id in context["stops"]:
+            add_end(ends, game, 1, (answer,))
+            continue
+        found = explore(context, (node_id, game, scene_vars), table)
+        for end, (paths, path) in found.items():
+            add_end(ends, dict(end), paths, (answer,) + path)
+    table[key] = ends
+    return ends
+
+
+def frontier(context, state, size):
+    """
+    Explores states breadth first, until there are at least size of them.
+
+    Returns the states reached, as {key: (paths, path, state)},
+    the ends reached on the way there (see explore()), and the keys
+    of every state seen, at any level, including those reached.
+    States reached by more than one path are merged.
+    """
+    level = {freeze(context, *state): (1, (), state)}
+    ends = {}
+    seen = set(level)
+    while level and len(level) < size:
+        next_level = {}
+        for paths, path, current in level.values():
+            for answer, node_id, game, scene_vars in answers(
+                    context, *current):
+                if node_id is None or node_id in context["stops"]:
+                    add_end(ends, game, paths, path + (answer,))
+                    continue
+                key = freeze(context, node_id, game, scene_vars)
+                if key in next_level:
+                    known = next_level[key]
+                    next_level[key] = (known[0] + paths,) + known[1:]
+                else:
+                    next_level[key] = (paths, path + (answer,),
+                                       (node_id, game, scene_vars))
+        level = next_level
+        seen.update(level)
+    return level, ends, seen
+
+
+def start_worker(until):
+    """
+    Loads the whole story in a worker process.
+    """
+    WORKER.update(explore_context(until))
+
+
+def explore_subtree(state):
+    """
+    Explores from state in a worker process.
+
+    Returns its ends (see explore()), and the keys of the states explored,
+    so that states also explored in other subtrees are counted once.
+    """
+    table = {}
+    ends = explore(WORKER, state, table)
+    return ends, set(table)
+
+
+def explore_story(start, until=None, workers=None):
+    """
+    Returns every end reachable from checkpoint start, and the states seen.
+
+    Exploration stops at checkpoint until, if given, or the story's end.
+    The states seen are counted once each, however many paths reach them.
+    """
+    context = explore_context(until)
+    story = context["story"]
+    game = dict(GAME_DEFAULTS, checkpoint=start)
+    scene_vars = {}
+    node_id = run(story, checkpoint_node(story, start), game, scene_vars,
+                  stops=context["stops"])
+    if node_id is None or node_id in context["stops"]:
+        return {tuple(sorted(game.items())): (1, ())}, 0
+    workers = workers or os.cpu_count()
+    level, ends, seen = frontier(context, (node_id, game, scene_vars),
+                                 workers * 8)
+    subtrees = list(level.values())
+    with ProcessPoolExecutor(workers, initializer=start_worker,
+                             initargs=(until,)) as pool:
+        results = pool.map(explore_subtree,
+                           [state for _, _, state in subtrees])
+        for (prefix_paths, prefix, _), (found, explored) in zip(subtrees,
+                                                                results):
+            seen.update(explored)
+            for end, (paths, path) in found.items():
+                add_end(ends, dict(end), prefix_paths * paths, prefix + path)
+    return ends, len(seen)
+
+
+def report(ends, states):
+    """
+    Prints each end state, with the paths to it, most common first.
+    """
+    total = sum(paths for paths, _ in ends.values())
+    print(f"Explored {states} states.")
+    print(f"{total} paths lead to {len(ends)} end states.\n")
+    for end, (paths, path) in sorted(ends.items(),
+                                     key=lambda item: -item[1][0]):
+        game = dict(end)
+        stats = ", ".join(f"{key} {game[key]}" for key in STATS)
+        changed = ", ".join(
+            f"{key} {value}" for key, value in end
+            if key not in STATS and value != GAME_DEFAULTS.get(key))
+        print(f"{paths:>10} paths: {stats}")
+        if changed:
+            print(f"{'':>12}changed: {changed}")
+        print(f"{'':>12}answers: {' '.join(path)}")
+
+
+def add_range_arguments(parser, scene_names):
+    """
+    Adds the --from and --until options, naming checkpoints, to parser.
+
+    They're shared by the tools that play through the story.
+    """
+    parser.add_argument("--from", dest="start", choices=scene_names,
+                        default=scene_names[0],
+                        help="checkpoint to start from")
+    parser.add_argument("--until", choices=scene_names[1:],
+                        help="checkpoint to stop at (default: the end)")
+
+
+def parse_range(parser, arguments, scene_names):
+    """
+    Returns (start, until), the checkpoints given with --from and --until.
+
+    until is None if --until wasn't given. Exits through parser
+    if it doesn't come after start.
+    """
+    start = scene_names.index(arguments.start)
+    until = None
+    if arguments.until:
+        until = scene_names.index(arguments.until)
+        if until <= start:
+            parser.error("--until must come after --from.")
+    return start, until
+
+
+def main():
+    """
+    Reads the command line options, then explores the story.
+    """
+    scene_names = open_story().scene_names
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_range_arguments(parser, scene_names)
+    parser.add_argument("--workers", type=int,
+                        help="worker processes (default: one per CPU)")
+    arguments = parser.parse_args()
+    start, until = parse_range(parser, arguments, scene_names)
+    report(*explore_story(start, until, arguments.workers))
+
+
+if __name__ == "__main__":
+    main()
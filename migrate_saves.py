@@ -0,0 +1,73 @@
+"""
+Upgrades every savegame to the current schema version, offline.
+
+Savegames are otherwise upgraded one at a time, as players load them.
+This script upgrades them all at once, e.g. before a release that
+changes the "game" dictionary. The backend and format are chosen
+by the same environment variables as the game (see README.md).
+
+Usage: python3 migrate_saves.py [--page-size N] [--chunk-size N] [--dry-run]
+
+Savegames are read a page at a time, rather than all at once.
+Upgraded rows are written back in chunks, with one batch update per chunk,
+and only the values that actually change are sent.
+"""
+
+import argparse
+from savedata import COMPACT_SAVES, GAME_DEFAULTS, read_savegame, values_to_row
+from storage import open_backend, row_changes
+
+
+def migrate(backend, page_size=500, chunk_size=100, dry_run=False):
+    """
+    Upgrades every savegame in backend, returning how many were changed.
+    """
+    pending = {}
+    changed = 0
+    for page in backend.scan(page_size):
+        for row in page:
+            values, outdated = read_savegame(row, GAME_DEFAULTS)
+            if not outdated:
+                continue
+            changes = row_changes(row, values_to_row(values, COMPACT_SAVES))
+            if changes:
+                pending[row[0]] = changes
+            if len(pending) >= chunk_size:
+                changed += flush(backend, pending, dry_run)
+    changed += flush(backend, pending, dry_run)
+    return changed
+
+
+def flush(backend, pending, dry_run):
+    """
+    Writes the pending changes in one batch, returning how many rows they hold.
+    """
+    count = len(pending)
+    if pending and not dry_run:
+        backend.write_batch(pending)
+    pending.clear()
+    return count
+
+
+def main():
+    """
+    Reads the command line options, then migrates the savegames.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--page-size", type=int, default=500,
+                        help="rows to read with each request")
+    parser.add_argument("--chunk-size", type=int, default=100,
+                        help="rows to write with each batch update")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="count outdated savegames without writing")
+    options = parser.parse_args()
+    changed = migrate(open_backend(), options.page_size,
+                      options.chunk_size, options.dry_run)
+    if options.dry_run:
+        print(f"{changed} savegames need upgrading.")
+    else:
+        print(f"{changed} savegames upgraded.")
+
+
+if __name__ == "__main__":
+    main()
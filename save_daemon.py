@@ -0,0 +1,108 @@
+"""
+Savegame daemon for "Double Agent".
+
+Every game session on the server runs its own copy of run.py.
+Without the daemon, each one authorizes with Google, connects to the
+sheet and loads the name index for itself. The daemon does this once,
+and serves every session's savegame requests over a Unix socket,
+through one storage stack (see storage.open_local_storage()).
+
+Usage: python3 save_daemon.py
+The socket path is read from SAVE_DAEMON_SOCKET (default "savegames.sock").
+Game sessions use the daemon when SAVE_DAEMON_SOCKET is set for them too.
+"""
+
+import atexit
+import json
+import os
+import signal
+import socketserver
+from storage import open_local_storage
+
+# The storage methods that sessions may call.
+METHODS = ("warm", "exists", "create", "read", "write")
+
+
+class SaveRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves the requests of one game session, for as long as it's connected.
+
+    Each request is a line of JSON naming a storage method and its
+    arguments. Each response is a line of JSON holding the result,
+    or the type and message of the error raised.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                method_name, args = read_request(line)
+                method = getattr(self.server.storage, method_name)
+                response = {"result": method(*args)}
+            except Exception as error:  # pylint: disable=broad-except
+                # The error's own type is sent, so only a missing
+                # savegame (a plain LookupError) is raised as one by the
+                # session, not a KeyError or IndexError from a bug.
+                response = {"error": type(error).__name__,
+                            "message": str(error)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+def read_request(line):
+    """
+    Returns the method name and arguments of a request line.
+
+    Raises ValueError if the request isn't {"method": ..., "args": [...]},
+    naming one of METHODS.
+    """
+    request = json.loads(line)
+    if (not isinstance(request, dict)
+            or not isinstance(request.get("args"), list)):
+        raise ValueError("Malformed request: it needs a method and args.")
+    if request.get("method") not in METHODS:
+        raise ValueError(f"Unknown method: {request.get('method')}")
+    return request["method"], request["args"]
+
+
+class SaveServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Listens for game sessions, serving each in its own thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, storage):
+        self.storage = storage
+        super().__init__(path, SaveRequestHandler)
+
+
+def stop(signum, frame):  # pylint: disable=unused-argument
+    """
+    Exits when the daemon is told to stop, running the atexit handlers.
+    """
+    raise SystemExit(0)
+
+
+def main():
+    """
+    Opens the storage, then serves savegame requests until stopped.
+
+    A socket left behind by a daemon that didn't exit cleanly is replaced.
+    Queued saves are sent before the daemon exits.
+    """
+    path = os.environ.get("SAVE_DAEMON_SOCKET", "savegames.sock")
+    storage = open_local_storage()
+    if os.path.exists(path):
+        os.unlink(path)
+    with SaveServer(path, storage) as server:
+        os.chmod(path, 0o600)
+        atexit.register(os.unlink, path)
+        atexit.register(storage.close)
+        signal.signal(signal.SIGHUP, stop)
+        signal.signal(signal.SIGTERM, stop)
+        storage.warm()
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
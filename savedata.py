@@ -0,0 +1,275 @@
+"""
+Savegame schema and formats for "Double Agent".
+
+The schema is versioned. Each savegame records the version it was saved in,
+and older savegames are upgraded by the registered migrations when loaded.
+Version 1 is the original layout, which didn't record its version.
+Version 2 adds the "save_version" key to the end of the "game" dictionary.
+Version 3 adds "reading_wpm", which replaces text_speed as the text speed.
+
+By default, a savegame row holds one value per key of the "game" dictionary.
+A snapshot instead packs the whole game (apart from the name) into one cell:
+    DA3:20:3:4:3:5:5:0:240:512
+"DA3" marks a snapshot of schema version 3. It's followed by the text speed
+in tenths of a second, then each number key of its layout (see
+SNAPSHOT_LAYOUTS), then one integer whose bits hold each of FLAG_KEYS.
+Every field is read back with int(), so loading doesn't need to
+round-trip values through floats.
+"""
+
+from os import environ
+
+SCHEMA_VERSION = 3
+SNAPSHOT_PREFIX = "DA"
+
+# If SAVE_FORMAT is "compact", each savegame is a snapshot in one cell,
+# so saving and loading touch only that cell.
+# Otherwise, each value of the "game" dictionary has its own column.
+# Savegames in either format can be loaded whichever format is chosen.
+COMPACT_SAVES = environ.get("SAVE_FORMAT") == "compact"
+
+# The starting values of the "game" dictionary, which stores all
+# persistent game data (see run.py). They also fill in keys an old
+# save lacks, so this module can be imported by tools without run.py.
+# The value of "name" is a string.
+# The value of "text_speed" is a float. It set the delay after each line
+# until reading_wpm replaced it (in version 3), and is kept so that
+# the columns after it don't move.
+# The values of the other keys are ints.
+# If these data types are changed, the savegame system may break.
+# Add any new key-value pairs to the end of the dictionary.
+# Do not insert new pairs between existing pairs.
+# This ensures backwards compatibility with old saves.
+# When adding a key, raise SCHEMA_VERSION
+# and register a migration below for savegames from the previous version.
+GAME_DEFAULTS = {
+    "name": "",
+    "text_speed": 2.0,
+    "checkpoint": 0,
+    "information": 0,
+    "legitimacy": 3,
+    "trust_gov": 5,
+    "trust_pref": 5,
+    "obeyed_pref": 0,
+    "under_duress": 0,
+    "try_to_flee": 0,
+    "travel_light": 0,
+    "adari_knife": 0,
+    "adari_poison": 0,
+    "khell_poison": 0,
+    "adari_outfit": 0,
+    "khell_uniform": 0,
+    "knife_taken": 0,
+    "offended_gov": 0,
+    "questioned_pref": 0,
+    "basement_info": 0,
+    "save_version": SCHEMA_VERSION,
+    "reading_wpm": 240
+}
+
+# Story lines average about 8 words. So a delay of text_speed seconds
+# after each line is a speed of about 60 * 8 / text_speed words a minute.
+WORDS_PER_LINE = 8
+
+# Registered migrations, by the version they upgrade from.
+MIGRATIONS = {}
+
+# Keys with values that may be any integer, in snapshot order.
+# Keys added later are given their own layout in SNAPSHOT_LAYOUTS.
+NUMBER_KEYS = [
+    "checkpoint",
+    "information",
+    "legitimacy",
+    "trust_gov",
+    "trust_pref",
+    "offended_gov"
+    ]
+
+# Keys with values that are only ever 0 or 1, in bit order.
+# New flags must be added to the end, so that old snapshots keep their bits.
+FLAG_KEYS = [
+    "obeyed_pref",
+    "under_duress",
+    "try_to_flee",
+    "travel_light",
+    "adari_knife",
+    "adari_poison",
+    "khell_poison",
+    "adari_outfit",
+    "khell_uniform",
+    "knife_taken",
+    "questioned_pref",
+    "basement_info"
+    ]
+
+# The keys held in a snapshot, for each schema version.
+# Versions 1 and 2 differ only in save_version, which is in the header.
+SNAPSHOT_LAYOUTS = {
+    1: (NUMBER_KEYS, FLAG_KEYS),
+    2: (NUMBER_KEYS, FLAG_KEYS),
+    3: (NUMBER_KEYS + ["reading_wpm"], FLAG_KEYS)
+    }
+
+
+def migration(from_version):
+    """
+    Registers a function that upgrades savegame values from from_version.
+
+    The function is given the values (a dictionary, which it may change)
+    and the default values of the "game" dictionary. It returns the values
+    as they should be in the next version.
+    """
+    def register(function):
+        MIGRATIONS[from_version] = function
+        return function
+    return register
+
+
+@migration(1)
+def record_save_version(values, defaults):
+    """
+    Upgrades version 1 values, which may come from a short row.
+
+    Rows saved before later keys were added to the "game" dictionary
+    have fewer columns. The missing keys are given their default values,
+    rather than keeping whatever the game held before loading.
+    """
+    for key, default in defaults.items():
+        values.setdefault(key, default)
+    return values
+
+
+@migration(2)
+def convert_text_speed(values, defaults):
+    """
+    Upgrades version 2 values, which set the text speed with text_speed.
+
+    Version 3 sets it with reading_wpm instead. The reading speed given
+    is the one that takes about as long over an average line.
+    """
+    text_speed = values.get("text_speed", defaults["text_speed"])
+    values["reading_wpm"] = round(60 * WORDS_PER_LINE / text_speed)
+    return values
+
+
+def upgrade(values, defaults):
+    """
+    Returns savegame values upgraded to SCHEMA_VERSION.
+
+    Each registered migration is applied in turn,
+    starting from the version the values were saved in.
+    """
+    version = values.get("save_version", 1)
+    while version < SCHEMA_VERSION:
+        values = MIGRATIONS[version](values, defaults)
+        version += 1
+        values["save_version"] = version
+    return values
+
+
+def row_to_values(row, keys):
+    """
+    Returns a dictionary of game values from a savegame row.
+
+    The sheet stores values as strings, so they're converted:
+    the name stays a string, text_speed becomes a float,
+    and the rest become ints (via float, as e.g. "2.0" may have been saved).
+    Keys with no value in the row (e.g. past its end) are left out.
+    """
+    values = {}
+    for key, value in zip(keys, row):
+        if value == "":
+            continue
+        if key == "name":
+            values[key] = str(value)
+        elif key == "text_speed":
+            values[key] = float(value)
+        else:
+            values[key] = int(float(value))
+    return values
+
+
+def read_savegame(row, defaults):
+    """
+    Returns (values, outdated) for a savegame row, in either format.
+
+    values is a complete dictionary of game values, in the key order of
+    defaults, upgraded to SCHEMA_VERSION. outdated is true if the savegame
+    should be written back: because it was upgraded, or because it was
+    missing values that are now filled in with defaults.
+    """
+    if len(row) > 1 and is_snapshot(row[1]):
+        values = decode_snapshot(row[1])
+        values["name"] = row[0]
+    else:
+        values = row_to_values(row, list(defaults))
+    outdated = values.get("save_version", 1) < SCHEMA_VERSION
+    values = upgrade(values, defaults)
+    outdated = outdated or any(key not in values for key in defaults)
+    return {key: values.get(key, default)
+            for key, default in defaults.items()}, outdated
+
+
+def values_to_row(values, compact=False):
+    """
+    Returns the savegame row to store for a dictionary of game values.
+
+    With compact saves, this is the name and a snapshot of everything else.
+    Otherwise, it's all the values, in key order.
+    """
+    if compact:
+        return [values["name"], encode_snapshot(values)]
+    return list(values.values())
+
+
+def is_snapshot(value):
+    """
+    Returns true if a saved value is a compact snapshot.
+    """
+    return isinstance(value, str) and value.startswith(SNAPSHOT_PREFIX)
+
+
+def encode_snapshot(game):
+    """
+    Returns the game dictionary packed into a snapshot string.
+
+    The snapshot uses the layout of the current schema version.
+    Raises ValueError if a flag holds anything other than 0 or 1,
+    as it couldn't be stored in a single bit.
+    """
+    number_keys, flag_keys = SNAPSHOT_LAYOUTS[SCHEMA_VERSION]
+    flags = 0
+    for bit, key in enumerate(flag_keys):
+        if game[key] not in (0, 1):
+            raise ValueError(f"{key} is {game[key]}, not 0 or 1.")
+        flags |= game[key] << bit
+    fields = [round(game["text_speed"] * 10)]
+    fields.extend(game[key] for key in number_keys)
+    fields.append(flags)
+    header = f"{SNAPSHOT_PREFIX}{SCHEMA_VERSION}"
+    return ":".join([header] + [str(field) for field in fields])
+
+
+def decode_snapshot(snapshot):
+    """
+    Returns a dictionary of the game values packed into snapshot.
+
+    The values include save_version, taken from the snapshot's header.
+    Raises ValueError if the snapshot is malformed,
+    or was written in a version this code doesn't know.
+    """
+    header, *fields = snapshot.split(":")
+    version = int(header[len(SNAPSHOT_PREFIX):])
+    if version not in SNAPSHOT_LAYOUTS:
+        raise ValueError(f"Unknown snapshot version: {version}")
+    number_keys, flag_keys = SNAPSHOT_LAYOUTS[version]
+    if len(fields) != len(number_keys) + 2:
+        raise ValueError(f"Snapshot has {len(fields)} fields.")
+    numbers = [int(field) for field in fields]
+    values = {"text_speed": numbers[0] / 10}
+    values.update(zip(number_keys, numbers[1:-1]))
+    flags = numbers[-1]
+    for bit, key in enumerate(flag_keys):
+        values[key] = flags >> bit & 1
+    values["save_version"] = version
+    return values
@@ -0,0 +1,335 @@
+"""
+Simulates many playthroughs of the story at once, to help balance stats.
+
+Each playthrough answers each choice at random, as its choice policy
+says, and the stats of every playthrough are reported as it reaches
+each checkpoint, and when it ends: their mean, spread and histogram.
+
+Playthroughs are simulated together, in NumPy arrays, with one element
+per playthrough for each value of "game" and each scene variable.
+The story's nodes are visited once each, in an order that puts every
+node before those that may follow it. The playthroughs at a node are
+all played through it at once, before being passed on to the nodes
+that follow. Increments follow the same rules as the game's
+(see story.inc_game_value()).
+
+Policies:
+  uniform: every option is as likely as any other.
+  loyal: always the first option, which is the loyal, obedient answer
+  to each of the story's choices.
+  defiant: always the last option.
+Chosen choices can be given their own odds with --weights, e.g.
+  --weights '{"opening_scene.spy_answer": [1, 1, 0]}'
+where each choice is named by the scene variable that holds its answer.
+
+NumPy is needed, but isn't installed with the game: pip3 install numpy
+
+Usage: python3 simulate_story.py [--runs N] [--policy NAME]
+       [--weights JSON] [--from SCENE] [--until SCENE] [--seed N]
+"""
+
+import argparse
+import json
+from explore_story import STATS, add_range_arguments, parse_range
+from savedata import GAME_DEFAULTS
+from story import checkpoint_node, open_story
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for this tool.
+    np = None
+
+# How many playthroughs are simulated in each batch.
+BATCH_SIZE = 1000000
+
+# The widest histogram bar, for 100% of playthroughs.
+BAR_WIDTH = 40
+
+
+def uniform(count):
+    """
+    Returns equal odds for each of count options.
+    """
+    return [1] * count
+
+
+def loyal(count):
+    """
+    Returns odds that always pick the first of count options.
+    """
+    return [1] + [0] * (count - 1)
+
+
+def defiant(count):
+    """
+    Returns odds that always pick the last of count options.
+    """
+    return [0] * (count - 1) + [1]
+
+
+# Choice policies, by name: functions of how many options a choice has.
+POLICIES = {"uniform": uniform, "loyal": loyal, "defiant": defiant}
+
+
+def code(value):
+    """
+    Returns a scene variable's value as an integer, for an array.
+
+    Answers ("1", "2", ...) become their numbers, True and False
+    become 1 and 0, and None (a variable not set yet) becomes 0.
+    """
+    if value is None:
+        return 0
+    return int(value)
+
+
+def story_order(story):
+    """
+    Returns the story's nodes in an order that puts each before its followers.
+
+    Raises ValueError if the story loops back on itself.
+    """
+    followers = []
+    waiting = [0] * len(story.nodes)
+    for node in story.nodes:
+        targets = {node[4]} | {target for _, target in node[3]}
+        targets.discard(None)
+        followers.append(targets)
+        for target in targets:
+            waiting[target] += 1
+    ready = [node_id for node_id, count in enumerate(waiting) if not count]
+    order = []
+    while ready:
+        node_id = ready.pop()
+        order.append(node_id)
+        for target in followers[node_id]:
+            waiting[target] -= 1
+            if not waiting[target]:
+                ready.append(target)
+    if len(order) != len(story.nodes):
+        raise ValueError("The story loops, so it can't be simulated.")
+    return order
+
+
+def choice_odds(story, policy, weights):
+    """
+    Returns the odds of each option, by choice node, as probabilities.
+
+    weights gives some choices' odds, by their scene variable;
+    the rest are given by policy.
+    """
+    odds = {}
+    choices = {node[2] for node in story.nodes if node[1]}
+    for var in weights:
+        if var not in choices:
+            raise ValueError(f"{var} isn't a choice.")
+    for node_id, (_, options, var, _, _) in enumerate(story.nodes):
+        if not options:
+            continue
+        chosen = weights.get(var) or policy(len(options))
+        if len(chosen) != len(options) or sum(chosen) <= 0:
+            raise ValueError(f"{var} needs {len(options)} weights.")
+        odds[node_id] = np.array(chosen, dtype=float) / sum(chosen)
+    return odds
+
+
+def test(condition, game, scene_vars, where):
+    """
+    Returns whether condition holds, for each playthrough at where.
+
+    As story.test(), for arrays of playthroughs.
+    """
+    kind = condition[0]
+    if kind == "not":
+        return ~test(condition[1], game, scene_vars, where)
+    if kind in ("all", "any"):
+        parts = [test(part, game, scene_vars, where)
+                 for part in condition[1]]
+        if kind == "all":
+            return np.logical_and.reduce(parts)
+        return np.logical_or.reduce(parts)
+    _, name, operator, expected = condition
+    if kind == "key":
+        values = game[name][where]
+    else:
+        values = scene_vars[name][where]
+    if operator == "==":
+        return values == code(expected)
+    if operator == "!=":
+        return values != code(expected)
+    return values != 0
+
+
+def apply(action, game, scene_vars, where):
+    """
+    Does what action does, for each playthrough at where.
+
+    As story.apply(), for arrays of playthroughs; output is ignored.
+    """
+    kind = action[0]
+    if kind == "add":
+        key, value = action[1], action[2]
+        # As inc_game_value(): under duress, the Prefect's trust
+        # can only be decreased.
+        if key == "trust_pref" and value > 0:
+            where = where[game["under_duress"][where] == 0]
+        game[key][where] += value
+    elif kind == "set":
+        game[action[1]][where] = action[2]
+    elif kind == "var":
+        scene_vars[action[1]][where] = code(action[2])
+
+
+def simulate(context, start, runs, rng, totals):
+    """
+    Simulates runs playthroughs from checkpoint start, at once.
+
+    Adds the stats of each playthrough, as it reaches each later
+    checkpoint and as it ends, to totals (see record()).
+    """
+    story = context["story"]
+    first = checkpoint_node(story, start)
+    game = {key: np.full(runs, value, dtype=np.int32)
+            for key, value in GAME_DEFAULTS.items()
+            if isinstance(value, int)}
+    game["checkpoint"][:] = start
+    scene_vars = {var: np.zeros(runs, dtype=np.int8)
+                  for var in context["vars"]}
+    arriving = {first: [np.arange(runs)]}
+    ended = []
+    for node_id in context["order"]:
+        if node_id not in arriving:
+            continue
+        where = np.concatenate(arriving.pop(node_id))
+        if node_id in context["stops"]:
+            ended.append(where)
+            continue
+        if node_id in story.scenes:
+            if node_id != first:
+                scene = story.scene_names[story.checkpoints.index(node_id)]
+                record(totals, scene, game, where)
+            for values in scene_vars.values():
+                values[where] = 0
+        actions, options, var, branches, following = story.nodes[node_id]
+        for action in actions:
+            apply(action, game, scene_vars, where)
+        if options:
+            answers = rng.choice(len(options), size=len(where),
+                                 p=context["odds"][node_id])
+            scene_vars[var][where] = answers + 1
+        for condition, target in branches:
+            taken = test(condition, game, scene_vars, where)
+            send(arriving, ended, target, where[taken])
+            where = where[~taken]
+        send(arriving, ended, following, where)
+    record(totals, "end", game, np.concatenate(ended))
+
+
+def send(arriving, ended, target, where):
+    """
+    Passes the playthroughs at where on to node target (None: the end).
+    """
+    if where.size == 0:
+        return
+    if target is None:
+        ended.append(where)
+    else:
+        arriving.setdefault(target, []).append(where)
+
+
+def record(totals, place, game, where):
+    """
+    Adds each stat of the playthroughs at where to its histogram.
+
+    totals holds {place: {stat: {value: playthroughs}}}.
+    """
+    histograms = totals.setdefault(place, {})
+    for stat in STATS:
+        values, counts = np.unique(game[stat][where], return_counts=True)
+        histogram = histograms.setdefault(stat, {})
+        for value, count in zip(values.tolist(), counts.tolist()):
+            histogram[value] = histogram.get(value, 0) + count
+
+
+def simulate_story(runs, policy="uniform", weights=None, start=0,
+                   until=None, seed=None):
+    """
+    Returns the histograms of runs simulated playthroughs (see record()).
+
+    Playthroughs start at checkpoint start, and end at checkpoint until,
+    if given, or the story's end. They're simulated in batches of
+    BATCH_SIZE, so memory use doesn't grow with runs.
+    """
+    story = open_story().load_all()
+    stops = ()
+    if until is not None:
+        stops = frozenset([checkpoint_node(story, until)])
+    context = {
+        "story": story,
+        "stops": stops,
+        "order": story_order(story),
+        "odds": choice_odds(story, POLICIES[policy], weights or {}),
+        "vars": {node[2] for node in story.nodes if node[2]} | {
+            action[1] for node in story.nodes for action in node[0]
+            if action[0] == "var"},
+    }
+    rng = np.random.default_rng(seed)
+    totals = {}
+    while runs > 0:
+        batch = min(runs, BATCH_SIZE)
+        simulate(context, start, batch, rng, totals)
+        runs -= batch
+    return totals
+
+
+def report(totals):
+    """
+    Prints the stats at each checkpoint: mean, spread and histogram.
+    """
+    for place, histograms in totals.items():
+        runs = sum(next(iter(histograms.values())).values())
+        title = "At the end" if place == "end" else f"At {place}"
+        print(f"{title} ({runs} playthroughs):")
+        for stat in STATS:
+            histogram = histograms[stat]
+            values = np.array(sorted(histogram))
+            counts = np.array([histogram[value] for value in values])
+            mean = (values * counts).sum() / runs
+            spread = np.sqrt(((values - mean) ** 2 * counts).sum() / runs)
+            print(f"  {stat}: mean {mean:.2f}, standard deviation "
+                  f"{spread:.2f}, from {values[0]} to {values[-1]}")
+            for value, count in zip(values, counts):
+                share = count / runs
+                bar = "█" * round(share * BAR_WIDTH)
+                print(f"    {value:>3} {share:>7.2%} {bar}")
+        print("")
+
+
+def main():
+    """
+    Reads the command line options, then simulates the playthroughs.
+    """
+    scene_names = open_story().scene_names
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=BATCH_SIZE,
+                        help="playthroughs to simulate")
+    parser.add_argument("--policy", choices=POLICIES, default="uniform",
+                        help="how choices are made")
+    parser.add_argument("--weights", type=json.loads, default={},
+                        help="odds of some choices' options, as JSON")
+    add_range_arguments(parser, scene_names)
+    parser.add_argument("--seed", type=int,
+                        help="random seed, to repeat a simulation")
+    options = parser.parse_args()
+    if np is None:
+        parser.exit(1, "simulate_story.py needs NumPy: pip3 install numpy\n")
+    start, until = parse_range(parser, options, scene_names)
+    try:
+        totals = simulate_story(options.runs, options.policy,
+                                options.weights, start, until, options.seed)
+    except ValueError as error:
+        parser.error(str(error))
+    report(totals)
+
+
+if __name__ == "__main__":
+    main()
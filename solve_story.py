@@ -0,0 +1,237 @@
+"""
+Finds the best path through the story, by a chosen measure.
+
+For example, the most information a player can have by the end of the
+story, while keeping the Prefect's trust above 0:
+  python3 solve_story.py --maximize information --require "trust_pref > 0"
+
+An objective is a sum of "game" values, each optionally multiplied,
+e.g. "information + 2 * trust_gov - trust_pref", to be maximized
+or minimized. Constraints compare a "game" value with a number
+(with >, >=, <, <=, == or !=), and must hold at every choice on the path,
+and at its end. The best path is printed as the answer to each choice,
+with the stats it ends with. Of paths that score the same, the one
+with the lowest answers is chosen.
+
+The states reachable from the start, and the answers that lead from each
+to the next, are found once and shared by every query (see Solver).
+Each query is then solved by dynamic programming over those states,
+with the best result from each state memoized, and each query's result
+is kept, so repeated queries are instant.
+
+Usage: python3 solve_story.py (--maximize | --minimize) OBJECTIVE
+       [--require CONSTRAINT ...] [--from SCENE] [--until SCENE]
+"""
+
+import argparse
+import operator
+import re
+from explore_story import (STATS, add_range_arguments, answers,
+                           explore_context, freeze, parse_range)
+from savedata import GAME_DEFAULTS
+from story import checkpoint_node, open_story, run
+
+# Comparisons allowed in constraints.
+COMPARISONS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+class Solver:
+    """
+    Answers best-path queries over the states of the story.
+
+    "states" holds each state reachable from checkpoint start, at a
+    choice, by its key (see explore_story.freeze()), as a list of
+    (answer, key, game): the "game" dictionary each answer leads to,
+    with the key of the state it leads to, or None where the path ends.
+    """
+
+    def __init__(self, start=0, until=None):
+        self.context = explore_context(until)
+        story = self.context["story"]
+        game = dict(GAME_DEFAULTS, checkpoint=start)
+        scene_vars = {}
+        node_id = run(story, checkpoint_node(story, start), game,
+                      scene_vars, stops=self.context["stops"])
+        self.game = game
+        self.root = None
+        self.states = {}
+        if node_id is not None and node_id not in self.context["stops"]:
+            self.root = self.add_state(node_id, game, scene_vars)
+        self.results = {}
+
+    def add_state(self, node_id, game, scene_vars):
+        """
+        Records a state, and every state reachable from it, once each.
+
+        Returns its key.
+        """
+        key = freeze(self.context, node_id, game, scene_vars)
+        if key in self.states:
+            return key
+        following = []
+        for answer, next_id, next_game, next_vars in answers(
+                self.context, node_id, game, scene_vars):
+            next_key = None
+            if next_id is not None and next_id not in self.context["stops"]:
+                next_key = self.add_state(next_id, next_game, next_vars)
+            following.append((answer, next_key, next_game))
+        self.states[key] = following
+        return key
+
+    def best(self, objective, constraints=()):
+        """
+        Returns the best path by objective that meets constraints.
+
+        objective is {key: weight}, and its score the sum of each
+        weight times that value of the final "game" dictionary.
+        constraints are (key, comparison, number), e.g. (">", ...).
+        Returns (score, answers, game), with the final "game" dictionary,
+        or None if no path meets the constraints.
+        """
+        query = (tuple(sorted(objective.items())), tuple(constraints))
+        if query not in self.results:
+            self.results[query] = self.solve(objective, constraints)
+        return self.results[query]
+
+    def solve(self, objective, constraints):
+        """
+        Returns the best path, by dynamic programming over the states.
+
+        The best result from each state is memoized, as many paths
+        share the rest of their way through the story.
+        """
+        def meets(game):
+            return all(COMPARISONS[comparison](game[key], number)
+                       for key, comparison, number in constraints)
+
+        def score(game):
+            return sum(weight * game[key]
+                       for key, weight in objective.items())
+
+        memo = {}
+
+        def best_from(key):
+            if key in memo:
+                return memo[key]
+            found = None
+            for answer, next_key, game in self.states[key]:
+                if not meets(game):
+                    continue
+                if next_key is None:
+                    result = (score(game), (), game)
+                else:
+                    result = best_from(next_key)
+                    if result is None:
+                        continue
+                if found is None or result[0] > found[0]:
+                    found = (result[0], (answer,) + result[1], result[2])
+            memo[key] = found
+            return found
+
+        if not meets(self.game):
+            return None
+        if self.root is None:
+            return (score(self.game), (), self.game)
+        return best_from(self.root)
+
+
+def parse_objective(text):
+    """
+    Returns an objective such as "information - 2 * trust_pref" as weights.
+
+    Raises ValueError if it names anything but a number key of "game".
+    """
+    compact = text.replace(" ", "")
+    if not re.fullmatch(r"([+-]?(\d+\*)?[a-z_]+)+", compact):
+        raise ValueError(f"Can't read the objective “{text}”.")
+    objective = {}
+    terms = re.findall(r"([+-]?)(?:(\d+)\*)?([a-z_]+)", compact)
+    for sign, number, key in terms:
+        check_key(key)
+        weight = int(number or 1) * (-1 if sign == "-" else 1)
+        objective[key] = objective.get(key, 0) + weight
+    return objective
+
+
+def parse_constraint(text):
+    """
+    Returns a constraint such as "trust_pref > 0" as (key, comparison, n).
+
+    Raises ValueError if it can't be read.
+    """
+    match = re.fullmatch(r"\s*([a-z_]+)\s*(>=|<=|==|!=|>|<)\s*(-?\d+)\s*",
+                         text)
+    if not match:
+        raise ValueError(f"Can't read the constraint “{text}”.")
+    key, comparison, number = match.groups()
+    check_key(key)
+    return (key, comparison, int(number))
+
+
+def check_key(key):
+    """
+    Raises ValueError unless key names a number in the "game" dictionary.
+    """
+    if not isinstance(GAME_DEFAULTS.get(key), int):
+        raise ValueError(f"“{key}” isn't a number in the game.")
+
+
+def report(result):
+    """
+    Prints the best path found, with the stats it ends with.
+    """
+    if result is None:
+        print("No path meets the constraints.")
+        return
+    score, path, game = result
+    print(f"Best score: {score}")
+    print(f"Answers: {' '.join(path) or '(no choices)'}")
+    print("Final stats: "
+          + ", ".join(f"{key} {game[key]}" for key in STATS))
+    changed = ", ".join(
+        f"{key} {value}" for key, value in sorted(game.items())
+        if key not in STATS and value != GAME_DEFAULTS.get(key))
+    if changed:
+        print(f"Changed: {changed}")
+
+
+def main():
+    """
+    Reads the command line options, then finds the best path.
+    """
+    scene_names = open_story().scene_names
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    goal = parser.add_mutually_exclusive_group(required=True)
+    goal.add_argument("--maximize", metavar="OBJECTIVE",
+                      help="sum of game values to maximize")
+    goal.add_argument("--minimize", metavar="OBJECTIVE",
+                      help="sum of game values to minimize")
+    parser.add_argument("--require", action="append", default=[],
+                        metavar="CONSTRAINT",
+                        help="comparison to hold throughout, e.g. "
+                        "\"trust_pref > 0\"")
+    add_range_arguments(parser, scene_names)
+    options = parser.parse_args()
+    start, until = parse_range(parser, options, scene_names)
+    try:
+        objective = parse_objective(options.maximize or options.minimize)
+        constraints = [parse_constraint(text) for text in options.require]
+    except ValueError as error:
+        parser.error(str(error))
+    if options.minimize:
+        objective = {key: -weight for key, weight in objective.items()}
+    result = Solver(start, until).best(objective, constraints)
+    if result and options.minimize:
+        result = (-result[0],) + result[1:]
+    report(result)
+
+
+if __name__ == "__main__":
+    main()
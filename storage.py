@@ -0,0 +1,1454 @@
+"""
+Savegame storage backends for "Double Agent".
+
+Every backend stores one row of values per username.
+Values are in the order of the keys of the "game" dictionary in run.py,
+so the username is always the first value of a row.
+Backends share the same methods: warm, exists, create, read, write
+and write_fields (which writes only some values of a row, by position).
+For bulk work, such as migrations, scan reads every row a page at a time,
+and write_batch writes values in many rows at once.
+
+Two backends are provided:
+  SheetsStorage stores rows in the Google Sheet used by the deployed game.
+  SQLiteStorage stores rows in a local SQLite database.
+    It suits servers with many players, and works fully offline,
+    e.g. for testing and benchmarking.
+open_storage() picks a backend from the SAVE_BACKEND environment variable.
+Requests to the Sheets API all pass through a RequestScheduler,
+which keeps them within the per-minute quota and retries failures.
+open_storage() wraps the backend in a DeltaStorage,
+which only sends changed values, and that in a JournalStorage,
+which records saves in a local journal file and sends them from a
+background thread, so gameplay needn't wait for (or fail with) the backend.
+WriteBehindStorage does the same with an in-memory queue only,
+for when no journal is wanted.
+If SAVE_DAEMON_SOCKET is set, open_storage() instead returns
+a DaemonStorage, which passes requests to the save daemon
+(save_daemon.py), so that one storage stack serves every game session.
+"""
+
+# gspread and the Google auth library are slow to import, so they're
+# imported by the functions that need them, when first called.
+# pylint: disable=import-outside-toplevel
+
+import fcntl
+import json
+import os
+import socket
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from random import uniform
+from threading import Condition, Lock, Thread, local
+from time import monotonic, sleep, time
+
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+    ]
+
+# Priorities for requests to the Sheets API. Lower numbers are served first.
+# Requests made by the player (e.g. loading a game) are interactive.
+# Threads doing background work (e.g. sending queued saves) set their own
+# priority in REQUEST_PRIORITY, so their requests wait behind the player's.
+INTERACTIVE = 0
+BACKGROUND = 1
+REQUEST_PRIORITY = local()
+
+# HTTP statuses worth retrying: too many requests, and server errors.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RequestScheduler:
+    """
+    Paces requests to the Sheets API, and retries those that fail.
+
+    A token bucket holds up to burst tokens, refilled at per_minute a minute
+    (matching the Sheets quota). Each request spends one token.
+    When tokens run out, requests wait, and interactive requests
+    are given tokens before background ones.
+    Requests rejected for quota reasons (429) or by server errors (5xx),
+    or lost to network errors, are retried with exponential backoff.
+    Each delay is randomised ("full jitter"), so that many sessions
+    retrying at once don't all hit the API again at the same moment.
+    Requests that mustn't be applied twice are only retried when
+    rejected for quota reasons (see should_retry()).
+    """
+
+    def __init__(self, per_minute=60, burst=10, attempts=6,
+                 base_delay=1, max_delay=32):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = monotonic()
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Number of requests waiting for a token, at each priority.
+        self.waiting = [0, 0]
+        self.changed = Condition()
+
+    def refill(self):
+        """
+        Adds the tokens earned since the bucket was last refilled.
+        """
+        now = monotonic()
+        earned = (now - self.refilled_at) * self.rate
+        self.tokens = min(self.burst, self.tokens + earned)
+        self.refilled_at = now
+
+    def acquire(self, priority):
+        """
+        Waits until a request of the given priority may be sent.
+        """
+        with self.changed:
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    self.refill()
+                    next_in_line = not any(self.waiting[:priority])
+                    if next_in_line and self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    # Wait for the next token, or for a more urgent
+                    # request to be served, whichever comes first.
+                    self.changed.wait((1 - self.tokens) / self.rate
+                                      if next_in_line else None)
+            finally:
+                self.waiting[priority] -= 1
+                self.changed.notify_all()
+
+    def call(self, request, *args, idempotent=True, **kwargs):
+        """
+        Returns request(*args, **kwargs), once quota allows it.
+
+        The priority is that of the calling thread (see REQUEST_PRIORITY).
+        idempotent is false for requests that would change the sheet
+        again if sent twice, such as appending a row.
+        """
+        priority = getattr(REQUEST_PRIORITY, "level", INTERACTIVE)
+        for attempt in range(self.attempts):
+            self.acquire(priority)
+            try:
+                return request(*args, **kwargs)
+            except Exception as error:  # pylint: disable=broad-except
+                last_attempt = attempt == self.attempts - 1
+                if last_attempt or not should_retry(error, idempotent):
+                    raise
+            backoff = min(self.max_delay, self.base_delay * 2**attempt)
+            sleep(uniform(0, backoff))
+        return None
+
+
+class TokenCache:
+    """
+    Shares Google access tokens between game sessions, through a file.
+
+    Without it, every session fetches a new token when it connects.
+    Tokens are stored with their expiry, by service account,
+    and a token is only used while it has at least MARGIN seconds left.
+    A flock on path + ".lock" is held while the cache is used,
+    so only one process at a time fetches a new token, and the others
+    wait for it, then use it. The file is readable by its owner only.
+    """
+
+    MARGIN = 300
+
+    def __init__(self, path=".sheets-token.json"):
+        self.path = path
+        self.lock_path = path + ".lock"
+
+    def load(self):
+        """
+        Returns the cached tokens, by service account email.
+        """
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self, tokens):
+        """
+        Replaces the cache file with tokens, readable by its owner only.
+        """
+        temp_path = self.path + ".tmp"
+        descriptor = os.open(
+            temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(descriptor, "w", encoding="utf-8") as cache_file:
+            json.dump(tokens, cache_file)
+        os.replace(temp_path, self.path)
+
+    def apply(self, creds):
+        """
+        Gives creds a valid access token, from the cache if possible.
+
+        If the cache has no token for creds with MARGIN seconds left,
+        a new one is fetched and cached.
+        """
+        from google.auth.transport.requests import Request
+        account = creds.service_account_email
+        with open(self.lock_path, "a", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            cached = self.load().get(account)
+            if cached and cached["expiry"] - time() > self.MARGIN:
+                creds.token = cached["token"]
+                # google-auth keeps expiry times as naive UTC datetimes.
+                creds.expiry = datetime.fromtimestamp(
+                    cached["expiry"], timezone.utc).replace(tzinfo=None)
+                return
+            creds.refresh(Request())
+            tokens = self.load()
+            tokens[account] = {
+                "token": creds.token,
+                "expiry": creds.expiry.replace(
+                    tzinfo=timezone.utc).timestamp()
+                }
+            self.save(tokens)
+
+
+class SheetsStorage:
+    """
+    Stores savegames in the "savegames" worksheet of a Google Sheet.
+
+    Row 1 of the worksheet holds column headings.
+    Each username is assigned one row below it.
+    """
+
+    # If a name isn't in the index, the index is reloaded (at most once
+    # a minute), in case another player has registered since it was loaded.
+    INDEX_MAX_AGE = 60
+
+    def __init__(self, scheduler=None, creds_file="creds.json",
+                 sheet_name="double-agent-rpg", worksheet_name="savegames",
+                 token_cache=None):
+        self.scheduler = scheduler or RequestScheduler()
+        self.creds_file = creds_file
+        self.token_cache = token_cache
+        self.sheet_name = sheet_name
+        self.worksheet_name = worksheet_name
+        self.saves = None
+        self.connect_lock = Lock()
+        # Maps each username in the sheet to its row number.
+        # Rows are never deleted or reordered, so a known row stays valid.
+        self.rows = {}
+        self.rows_loaded_at = None
+        self.index_lock = Lock()
+
+    def worksheet(self):
+        """
+        Returns the savegame worksheet, connecting to it first if necessary.
+
+        Credential values as per the Code Institute Love Sandwiches
+        walkthrough. The lock ensures that only one connection is made,
+        even if warm() is still connecting when the sheet is needed.
+        """
+        with self.connect_lock:
+            if self.saves is None:
+                import gspread
+                from google.oauth2.service_account import Credentials
+                creds = Credentials.from_service_account_file(self.creds_file)
+                scoped_creds = creds.with_scopes(SCOPE)
+                if self.token_cache is not None:
+                    self.token_cache.apply(scoped_creds)
+                gspread_client = gspread.authorize(scoped_creds)
+                sheet = self.scheduler.call(
+                    gspread_client.open, self.sheet_name)
+                self.saves = self.scheduler.call(
+                    sheet.worksheet, self.worksheet_name)
+            return self.saves
+
+    def request(self, method_name, *args, idempotent=True, **kwargs):
+        """
+        Calls a method of the worksheet through the request scheduler.
+
+        idempotent is as for RequestScheduler.call().
+        """
+        method = getattr(self.worksheet(), method_name)
+        return self.scheduler.call(method, *args, idempotent=idempotent,
+                                   **kwargs)
+
+    def warm(self):
+        """
+        Starts connecting to the worksheet in a background thread.
+
+        Errors are ignored here: if the connection fails,
+        worksheet() will try again (and raise) when a save is first used.
+        """
+        def connect():
+            try:
+                self.worksheet()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+        Thread(target=connect, daemon=True).start()
+
+    def load_index(self):
+        """
+        Reloads the name-to-row index from the name column of the sheet.
+
+        If a name somehow appears twice, its first row is used,
+        as the find() method of the worksheet would have done.
+        """
+        names = self.request("col_values", 1)
+        rows = {}
+        # Row 1 is the column heading ("name"), so names start from row 2.
+        for row, name in enumerate(names[1:], start=2):
+            if name:
+                rows.setdefault(name, row)
+        self.rows = rows
+        self.rows_loaded_at = monotonic()
+
+    def find_row(self, name, fresh=False):
+        """
+        Returns the row number of name in the worksheet, or None.
+
+        Lookups are served from the index, which is loaded once per session,
+        so they don't each have to search the whole sheet.
+        If fresh is true, a name missing from the index is always looked
+        for again in the sheet, however recently the index was loaded.
+        """
+        with self.index_lock:
+            loaded_at = self.rows_loaded_at
+            stale = (fresh or loaded_at is None
+                     or monotonic() - loaded_at > self.INDEX_MAX_AGE)
+            if name not in self.rows and stale:
+                self.load_index()
+            return self.rows.get(name)
+
+    def exists(self, name, fresh=False):
+        """
+        Returns true if name has a row in the worksheet.
+
+        fresh is as for find_row().
+        """
+        return self.find_row(name, fresh) is not None
+
+    def create(self, values):
+        """
+        Adds a new row holding values, which begin with the username.
+
+        The row is created with a single append request,
+        so the sheet itself assigns the next empty row.
+        Two players registering at the same moment can't be given the same
+        row, and creation doesn't need to read the existing names first.
+        An append is never retried if it may have been applied, as that
+        would add a second row: the error is raised instead.
+        """
+        response = self.request(
+            "append_row", values, idempotent=False,
+            value_input_option="USER_ENTERED", table_range="A1")
+        from gspread.utils import a1_to_rowcol
+        # The response names the appended range, e.g. "savegames!A7:T7".
+        # Its row is added to the index, so later saves needn't look it up.
+        first_cell = response["updates"]["updatedRange"].split("!")[-1]
+        name_row = a1_to_rowcol(first_cell.split(":")[0])[0]
+        with self.index_lock:
+            self.rows.setdefault(values[0], name_row)
+
+    def read(self, name, width=None):
+        """
+        Returns the values in the row of name, as strings.
+
+        If width is given, only that many values are read from the row.
+        """
+        name_row = self.find_row(name)
+        if name_row is None:
+            raise LookupError(f"No savegame found for {name}.")
+        if width is None:
+            return self.request("row_values", name_row)
+        from gspread.utils import rowcol_to_a1
+        last_cell = rowcol_to_a1(name_row, width)
+        found = self.request("get_values", f"A{name_row}:{last_cell}")
+        return found[0] if found else []
+
+    def write(self, name, values):
+        """
+        Overwrites the row of name with values.
+
+        The whole row is written with a single range update,
+        so each save costs one request to the Sheets API.
+        """
+        name_row = self.find_row(name)
+        if name_row is None:
+            raise LookupError(f"No savegame found for {name}.")
+        from gspread.utils import rowcol_to_a1
+        last_cell = rowcol_to_a1(name_row, len(values))
+        self.request(
+            "update", f"A{name_row}:{last_cell}", [values],
+            value_input_option="USER_ENTERED")
+
+    def write_fields(self, name, changes):
+        """
+        Writes only some values in the row of name.
+
+        changes maps positions in the row (counting from 0) to new values.
+        Neighbouring positions are grouped into ranges,
+        and all the ranges are sent in a single batch update.
+        """
+        self.write_batch({name: changes})
+
+    def write_batch(self, changes):
+        """
+        Writes some values in the rows of several names at once.
+
+        changes maps each name to a dictionary of positions and values,
+        as for write_fields. All rows are sent in a single batch update.
+        """
+        from gspread.utils import rowcol_to_a1
+        data = []
+        for name, fields in changes.items():
+            name_row = self.find_row(name)
+            if name_row is None:
+                raise LookupError(f"No savegame found for {name}.")
+            for first, last in position_runs(fields):
+                first_cell = rowcol_to_a1(name_row, first + 1)
+                last_cell = rowcol_to_a1(name_row, last + 1)
+                data.append({
+                    "range": f"{first_cell}:{last_cell}",
+                    "values": [[fields[i] for i in range(first, last + 1)]]
+                    })
+        if data:
+            self.request(
+                "batch_update", data, value_input_option="USER_ENTERED")
+
+    def scan(self, page_size=500):
+        """
+        Yields every savegame row in the worksheet, a page at a time.
+
+        Each page is a list of rows, fetched with one request.
+        The rows' names are added to the index as they are read.
+        """
+        first_row = 2
+        while True:
+            last_row = first_row + page_size - 1
+            page = self.request("get_values", f"{first_row}:{last_row}")
+            rows = []
+            with self.index_lock:
+                for name_row, row in enumerate(page, start=first_row):
+                    if row and row[0]:
+                        self.rows.setdefault(row[0], name_row)
+                        rows.append(row)
+            if rows:
+                yield rows
+            if len(page) < page_size:
+                return
+            first_row = last_row + 1
+
+
+class SQLiteStorage:
+    """
+    Stores savegames in a local SQLite database.
+
+    Each row is keyed (and so indexed) by username.
+    The remaining values are stored as a JSON list, in game key order,
+    so the dictionary can grow without the table needing to change.
+    The database runs in WAL mode, so many game sessions can read it
+    while another one writes. A path of ":memory:" keeps it in memory only.
+    """
+
+    def __init__(self, path="savegames.db"):
+        self.path = path
+        self.connection = None
+        self.lock = Lock()
+
+    def database(self):
+        """
+        Returns the database connection, opening it first if necessary.
+
+        The connection may be used from several threads,
+        so all use of it happens under the lock.
+        """
+        if self.connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=10, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS savegames ("
+                "name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            connection.commit()
+            self.connection = connection
+        return self.connection
+
+    def warm(self):
+        """
+        Opens the database. This is quick, so no thread is needed.
+        """
+        with self.lock:
+            self.database()
+
+    def exists(self, name, fresh=False):  # pylint: disable=unused-argument
+        """
+        Returns true if name has a savegame in the database.
+
+        The database is always read, so fresh (see SheetsStorage) is ignored.
+        """
+        with self.lock:
+            found = self.database().execute(
+                "SELECT 1 FROM savegames WHERE name = ?", (name,)).fetchone()
+        return found is not None
+
+    def create(self, values):
+        """
+        Adds a new savegame holding values, which begin with the username.
+
+        If the name is already present, its savegame is replaced.
+        """
+        with self.lock, self.database() as connection:
+            connection.execute(
+                "INSERT INTO savegames (name, data) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                (values[0], json.dumps(values[1:])))
+
+    def read(self, name, width=None):
+        """
+        Returns the values in the savegame of name, beginning with the name.
+
+        If width is given, only that many values are returned.
+        """
+        with self.lock:
+            found = self.database().execute(
+                "SELECT data FROM savegames WHERE name = ?",
+                (name,)).fetchone()
+        if found is None:
+            raise LookupError(f"No savegame found for {name}.")
+        return ([name] + json.loads(found[0]))[:width]
+
+    def write(self, name, values):
+        """
+        Overwrites the savegame of name with values.
+        """
+        with self.lock, self.database() as connection:
+            updated = connection.execute(
+                "UPDATE savegames SET data = ? WHERE name = ?",
+                (json.dumps(values[1:]), name))
+        if not updated.rowcount:
+            raise LookupError(f"No savegame found for {name}.")
+
+    def write_fields(self, name, changes):
+        """
+        Writes only some values in the savegame of name.
+
+        changes maps positions in the row (counting from 0) to new values.
+        The stored list is read and rewritten in one transaction.
+        """
+        self.write_batch({name: changes})
+
+    def write_batch(self, changes):
+        """
+        Writes some values in the savegames of several names at once.
+
+        changes maps each name to a dictionary of positions and values,
+        as for write_fields. All the savegames are updated in one transaction.
+        """
+        with self.lock, self.database() as connection:
+            for name, fields in changes.items():
+                found = connection.execute(
+                    "SELECT data FROM savegames WHERE name = ?",
+                    (name,)).fetchone()
+                if found is None:
+                    raise LookupError(f"No savegame found for {name}.")
+                values = [name] + json.loads(found[0])
+                for position, value in fields.items():
+                    values.extend([""] * (position + 1 - len(values)))
+                    values[position] = value
+                connection.execute(
+                    "UPDATE savegames SET data = ? WHERE name = ?",
+                    (json.dumps(values[1:]), name))
+
+    def close(self, timeout=None):  # pylint: disable=unused-argument
+        """
+        Closes the database. Writes are never queued, so none are lost.
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+        return True
+
+    def scan(self, page_size=500):
+        """
+        Yields every savegame in the database, a page at a time.
+
+        Each page is a list of rows, each beginning with the name.
+        Pages follow on from the last name read, so each page
+        is found through the index rather than by skipping rows.
+        """
+        last_name = ""
+        while True:
+            with self.lock:
+                page = self.database().execute(
+                    "SELECT name, data FROM savegames WHERE name > ? "
+                    "ORDER BY name LIMIT ?", (last_name, page_size)).fetchall()
+            if not page:
+                return
+            yield [[name] + json.loads(data) for name, data in page]
+            last_name = page[-1][0]
+
+
+class DeltaStorage:
+    """
+    Wraps a backend so that writes only send values that have changed.
+
+    It remembers the last values successfully created, read or written
+    for each name. When a row is written again, only the positions
+    that differ are sent, through the backend's write_fields method.
+    If nothing is known about a name yet, the whole row is written.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.persisted = {}
+
+    def warm(self):
+        """
+        Warms the wrapped backend.
+        """
+        self.backend.warm()
+
+    def exists(self, name, fresh=False):
+        """
+        Returns true if name has a stored savegame.
+
+        fresh is passed on to the backend (see SheetsStorage.find_row()).
+        """
+        return self.backend.exists(name, fresh)
+
+    def create(self, values):
+        """
+        Creates a savegame, remembering the values that were stored.
+        """
+        self.backend.create(values)
+        self.persisted[values[0]] = list(values)
+
+    def read(self, name, width=None):
+        """
+        Returns the stored values of name, remembering them.
+        """
+        values = self.backend.read(name, width)
+        self.persisted[name] = list(values)
+        return values
+
+    def write(self, name, values):
+        """
+        Writes the values of name that differ from those last persisted.
+        """
+        last_values = self.persisted.get(name)
+        if last_values is None or len(last_values) != len(values):
+            self.backend.write(name, values)
+        else:
+            changes = row_changes(last_values, values)
+            if changes:
+                self.backend.write_fields(name, changes)
+        self.persisted[name] = list(values)
+
+    def write_rows(self, rows):
+        """
+        Writes the rows of several names at once, sending only changes.
+
+        rows maps each name to its values. Every changed value goes to the
+        backend's write_batch method, so the backend is sent one batch.
+        Rows of names that nothing is known about are sent whole.
+        """
+        changes = {}
+        for name, values in rows.items():
+            last_values = self.persisted.get(name)
+            if last_values is None or len(last_values) != len(values):
+                changes[name] = dict(enumerate(values))
+            else:
+                fields = row_changes(last_values, values)
+                if fields:
+                    changes[name] = fields
+        if changes:
+            self.backend.write_batch(changes)
+        for name, values in rows.items():
+            self.persisted[name] = list(values)
+
+    def forget(self):
+        """
+        Forgets every row remembered, so each is next written whole.
+
+        Used when other processes may have written rows since,
+        which would leave what is remembered of them out of date.
+        """
+        self.persisted.clear()
+
+    def write_fields(self, name, changes):
+        """
+        Writes some values of name, updating what is remembered of them.
+        """
+        self.backend.write_fields(name, changes)
+        last_values = self.persisted.get(name)
+        if last_values is not None:
+            for position, value in changes.items():
+                if position < len(last_values):
+                    last_values[position] = value
+
+
+class WriteBehindStorage:
+    """
+    Wraps a backend so that writes are queued and flushed in the background.
+
+    write() returns at once. A worker thread sends queued rows to the
+    backend. If several writes for one name are waiting, only the latest
+    is sent. Reads of a name with a queued write return the queued values.
+    close() (or flush()) must be called before exiting, so nothing is lost.
+    """
+
+    # Seconds to wait before retrying after the backend fails a write.
+    RETRY_DELAY = 2
+
+    def __init__(self, backend):
+        self.backend = backend
+        # Latest unsent values for each name, and the values being sent.
+        self.pending = {}
+        self.in_flight = {}
+        self.changed = Condition()
+        self.worker = None
+        self.closing = False
+
+    def warm(self):
+        """
+        Warms the wrapped backend.
+        """
+        self.backend.warm()
+
+    def queued(self, name):
+        """
+        Returns the newest values waiting to be sent for name, or None.
+        """
+        with self.changed:
+            values = self.pending.get(name, self.in_flight.get(name))
+        return None if values is None else list(values)
+
+    def exists(self, name):
+        """
+        Returns true if name has a queued write or a stored savegame.
+        """
+        return self.queued(name) is not None or self.backend.exists(name)
+
+    def create(self, values):
+        """
+        Creates a savegame at once, so queued writes always find it.
+        """
+        self.backend.create(values)
+
+    def read(self, name, width=None):
+        """
+        Returns the values of name, preferring any still waiting to be sent.
+
+        Queued values are returned whole, even if width is given.
+        """
+        values = self.queued(name)
+        if values is None:
+            values = self.backend.read(name, width)
+        return values
+
+    def write(self, name, values):
+        """
+        Queues values to be written for name, replacing any older ones.
+        """
+        with self.changed:
+            self.pending[name] = list(values)
+            if self.worker is None:
+                self.worker = Thread(target=self.send_queued, daemon=True)
+                self.worker.start()
+            self.changed.notify_all()
+
+    def send_queued(self):
+        """
+        Runs in the worker thread, sending queued writes to the backend.
+
+        If a write fails, it's queued again (unless a newer one is waiting)
+        and retried after RETRY_DELAY seconds.
+        Its requests have background priority (see RequestScheduler),
+        so they never hold up requests made for the player.
+        """
+        REQUEST_PRIORITY.level = BACKGROUND
+        while True:
+            with self.changed:
+                while not self.pending:
+                    self.changed.wait()
+                name = next(iter(self.pending))
+                values = self.pending.pop(name)
+                self.in_flight[name] = values
+            try:
+                self.backend.write(name, values)
+                failed = False
+            except Exception:  # pylint: disable=broad-except
+                failed = True
+            with self.changed:
+                del self.in_flight[name]
+                if failed:
+                    self.pending.setdefault(name, values)
+                self.changed.notify_all()
+                if failed and not self.closing:
+                    self.changed.wait(self.RETRY_DELAY)
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued write has been sent.
+
+        Returns false if writes were still waiting after timeout seconds.
+        """
+        with self.changed:
+            return self.changed.wait_for(
+                lambda: not self.pending and not self.in_flight, timeout)
+
+    def close(self, timeout=10):
+        """
+        Sends any queued writes before the game exits.
+
+        Gives up after timeout seconds, so an unreachable backend
+        can't keep the process alive forever.
+        """
+        with self.changed:
+            self.closing = True
+            self.changed.notify_all()
+        return self.flush(timeout)
+
+
+class SaveJournal:
+    """
+    An append-only file of saves on local disk, one line of JSON per save.
+
+    Each entry holds the operation ("create" or "write"), the name and
+    the values. Entries are fsync'd, so one survives a crash or a
+    lost connection as soon as append() returns.
+    A sidecar file (path + ".ack") holds the offset of the first entry
+    that hasn't yet been sent to the backend. Several game processes may
+    share the journal: each holds a flock on it while using it, and only
+    the process holding the lock on path + ".lock" sends entries.
+    That file names the process that last sent entries, so each process
+    knows when others have sent some since it last did (others_sent).
+    Entries the backend can never accept are set aside in path + ".rejected".
+    """
+
+    def __init__(self, path="savegames.journal"):
+        self.path = path
+        self.ack_path = path + ".ack"
+        self.rejected_path = path + ".rejected"
+        self.claim_path = path + ".lock"
+        self.claim_file = None
+        # (pid, random hex) naming this journal in this process.
+        self.token = None
+        self.others_sent = True
+
+    @contextmanager
+    def locked(self, operation):
+        """
+        Opens the journal, holding a flock on it until the block ends.
+
+        operation is fcntl.LOCK_SH for reading, or fcntl.LOCK_EX to change it.
+        """
+        with open(self.path, "a+b") as journal_file:
+            fcntl.flock(journal_file, operation)
+            yield journal_file
+
+    def append(self, entry):
+        """
+        Adds an entry to the end of the journal, and syncs it to disk.
+
+        If a crash cut the last entry short, a line break is added first,
+        so the new entry isn't joined onto the broken one.
+        """
+        line = json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+        with self.locked(fcntl.LOCK_EX) as journal_file:
+            if os.fstat(journal_file.fileno()).st_size:
+                journal_file.seek(-1, os.SEEK_END)
+                if journal_file.read(1) != b"\n":
+                    line = b"\n" + line
+            journal_file.write(line)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def reject(self, entry):
+        """
+        Sets aside an entry that the backend can never accept.
+
+        It's added to the rejected file, so it can still be looked into,
+        and the entries after it can be sent.
+        """
+        line = json.dumps(entry, separators=(",", ":")).encode() + b"\n"
+        with open(self.rejected_path, "ab") as rejected_file:
+            rejected_file.write(line)
+            rejected_file.flush()
+            os.fsync(rejected_file.fileno())
+
+    def acked(self):
+        """
+        Returns the offset of the first entry not yet sent.
+        """
+        try:
+            with open(self.ack_path, encoding="utf-8") as ack_file:
+                return int(ack_file.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def acknowledge(self, offset):
+        """
+        Records that every entry before offset has been sent.
+
+        The offset is written to a new file, which then replaces the old,
+        so a crash can't leave the sidecar half written.
+        """
+        temp_path = self.ack_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as ack_file:
+            ack_file.write(str(offset))
+            ack_file.flush()
+            os.fsync(ack_file.fileno())
+        os.replace(temp_path, self.ack_path)
+
+    def pending(self, limit=None):
+        """
+        Returns (entries, end): entries not yet sent, in the order written.
+
+        At most limit entries are returned, if limit is given.
+        end is the offset just after the last of them.
+        Lines that can't be read (left by a crash mid-write) are skipped.
+        """
+        entries = []
+        with self.locked(fcntl.LOCK_SH) as journal_file:
+            end = self.acked()
+            journal_file.seek(end)
+            for line in journal_file:
+                end += len(line)
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+                if limit and len(entries) >= limit:
+                    break
+        return entries, end
+
+    def discard_sent(self, end):
+        """
+        Empties the journal if nothing was added after offset end.
+
+        Returns true if it was emptied. The sidecar is reset first:
+        if a crash comes between the two, entries are only sent twice,
+        rather than new entries being skipped.
+        """
+        with self.locked(fcntl.LOCK_EX) as journal_file:
+            if os.fstat(journal_file.fileno()).st_size > end:
+                return False
+            self.acknowledge(0)
+            journal_file.truncate(0)
+            return True
+
+    def claim(self):
+        """
+        Returns true if this process may send entries, claiming it if free.
+
+        On claiming, others_sent is set to whether another process
+        (or another journal object) was the last to claim it.
+        """
+        if self.claim_file is None:
+            claim_file = open(self.claim_path, "a+", encoding="utf-8")
+            try:
+                fcntl.flock(claim_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                claim_file.close()
+                return False
+            # A forked process mustn't share its parent's token.
+            if self.token is None or self.token[0] != os.getpid():
+                self.token = (os.getpid(), os.urandom(8).hex())
+            token = f"{self.token[0]}:{self.token[1]}"
+            claim_file.seek(0)
+            self.others_sent = claim_file.read() != token
+            claim_file.truncate(0)
+            claim_file.write(token)
+            claim_file.flush()
+            self.claim_file = claim_file
+        return True
+
+    def release(self):
+        """
+        Lets other processes send entries again.
+        """
+        if self.claim_file is not None:
+            self.claim_file.close()
+            self.claim_file = None
+
+
+class JournalStorage:
+    """
+    Wraps a backend so that saves are recorded in a local journal first.
+
+    create() and write() return as soon as the save is in the journal,
+    so gameplay goes on at local disk speed, even if the backend is slow
+    or unreachable. A replayer thread sends journal entries to the backend
+    in order, a batch at a time, retrying until the backend responds.
+    Writes to savegames the backend doesn't have are rejected, not retried.
+    Entries left by a session that crashed or lost its connection
+    are sent by the next session to start.
+    Reads of a name prefer its newest unsent entry to the backend's values.
+    """
+
+    # Entries sent to the backend in each batch.
+    REPLAY_BATCH = 50
+    # Seconds to wait before retrying after the backend fails.
+    RETRY_DELAY = 2
+
+    def __init__(self, backend, journal):
+        self.backend = backend
+        self.journal = journal
+        self.changed = Condition()
+        self.replayer = None
+        # Counts appends, so the replayer knows if any came while it sent.
+        self.appended = 0
+        self.drained = False
+
+    def warm(self):
+        """
+        Warms the wrapped backend, and sends any entries left unsent.
+        """
+        self.backend.warm()
+        self.start_replay()
+
+    def latest(self, name):
+        """
+        Returns the newest unsent values in the journal for name, or None.
+        """
+        entries, _ = self.journal.pending()
+        values = None
+        for entry in entries:
+            if entry["name"] == name:
+                values = entry["values"]
+        return values
+
+    def exists(self, name):
+        """
+        Returns true if name has an unsent entry or a stored savegame.
+        """
+        return self.latest(name) is not None or self.backend.exists(name)
+
+    def create(self, values):
+        """
+        Records a new savegame in the journal.
+        """
+        self.journal.append(
+            {"op": "create", "name": values[0], "values": list(values)})
+        self.start_replay()
+
+    def read(self, name, width=None):
+        """
+        Returns the values of name, preferring any still in the journal.
+
+        Journal values are returned whole, even if width is given.
+        """
+        values = self.latest(name)
+        if values is None:
+            values = self.backend.read(name, width)
+        return values
+
+    def write(self, name, values):
+        """
+        Records values to be written for name in the journal.
+        """
+        self.journal.append(
+            {"op": "write", "name": name, "values": list(values)})
+        self.start_replay()
+
+    def start_replay(self):
+        """
+        Wakes the replayer thread, starting it first if necessary.
+        """
+        with self.changed:
+            self.appended += 1
+            self.drained = False
+            if self.replayer is None:
+                self.replayer = Thread(target=self.replay, daemon=True)
+                self.replayer.start()
+            self.changed.notify_all()
+
+    def replay(self):
+        """
+        Runs in the replayer thread, sending journal entries to the backend.
+
+        Its requests have background priority (see RequestScheduler),
+        so they never hold up requests made for the player.
+        """
+        REQUEST_PRIORITY.level = BACKGROUND
+        while True:
+            with self.changed:
+                appended = self.appended
+            try:
+                sent = self.send_pending()
+            except Exception:  # pylint: disable=broad-except
+                sent = False
+            with self.changed:
+                self.drained = sent and appended == self.appended
+                self.changed.notify_all()
+                if self.drained:
+                    self.changed.wait_for(lambda: not self.drained)
+                elif not sent:
+                    self.changed.wait(self.RETRY_DELAY)
+
+    def send_pending(self):
+        """
+        Sends journal entries to the backend until none are left.
+
+        Returns false without sending anything if another process
+        is already sending them. The journal is emptied once all are sent.
+        If other processes have sent entries since this one last did,
+        what the backend remembers of each row may be out of date,
+        so it's forgotten, and rows are next written whole.
+        """
+        if not self.journal.claim():
+            return False
+        if self.journal.others_sent:
+            self.backend.forget()
+        try:
+            while True:
+                entries, end = self.journal.pending(self.REPLAY_BATCH)
+                if not entries and self.journal.discard_sent(end):
+                    return True
+                self.send(entries)
+                self.journal.acknowledge(end)
+        finally:
+            self.journal.release()
+
+    def send(self, entries):
+        """
+        Sends a batch of journal entries to the backend.
+
+        Writes are sent together, with only the newest values of each name.
+        A savegame is created only if the backend doesn't have it yet:
+        an entry may be sent twice, if a crash came before it was
+        acknowledged, and its savegame mustn't be created twice.
+        Another process may have created it since the backend last
+        looked, so the backend is asked to look again (fresh).
+        """
+        rows = {}
+        for entry in entries:
+            name = entry["name"]
+            if (entry["op"] == "create"
+                    and not self.backend.exists(name, fresh=True)):
+                self.send_rows(rows)
+                rows.clear()
+                self.backend.create(entry["values"])
+            else:
+                rows[name] = entry
+        self.send_rows(rows)
+
+    def send_rows(self, rows):
+        """
+        Writes the newest entry of each name, given as {name: entry}.
+
+        A write to a name the backend doesn't have (raising LookupError)
+        would fail however often it was retried, and hold up every entry
+        after it. So if the batch fails that way, each name is written
+        alone. A name that still fails may have been created by another
+        process since the backend last looked, so it's looked for again
+        (fresh), and written if found. Only the entries of names that
+        really are missing are rejected (see SaveJournal.reject()),
+        letting the others through.
+        """
+        try:
+            self.backend.write_rows(
+                {name: entry["values"] for name, entry in rows.items()})
+        except LookupError:
+            for name, entry in rows.items():
+                try:
+                    self.backend.write_rows({name: entry["values"]})
+                except LookupError:
+                    if not self.backend.exists(name, fresh=True):
+                        self.journal.reject(entry)
+                        continue
+                    self.backend.write_rows({name: entry["values"]})
+
+    def flush(self, timeout=None):
+        """
+        Waits until every journal entry has been sent.
+
+        Returns false if entries were still waiting after timeout seconds.
+        Unsent entries aren't lost: they stay in the journal.
+        """
+        with self.changed:
+            return self.changed.wait_for(lambda: self.drained, timeout)
+
+    def close(self, timeout=10):
+        """
+        Tries to send the journal's entries before the game exits.
+        """
+        self.start_replay()
+        return self.flush(timeout)
+
+
+class DaemonStorage:
+    """
+    Passes savegame requests to the save daemon over a Unix socket.
+
+    The daemon (see save_daemon.py) owns one storage stack for every game
+    session on the server, so Google is only authorized once per server,
+    and the name index and journal are shared.
+    Each request is one line of JSON, answered by one line of JSON.
+    If the daemon can't be reached, requests are served instead by the
+    local storage stack returned by fallback(), so saves still work.
+    """
+
+    def __init__(self, path, fallback):
+        self.path = path
+        self.fallback = fallback
+        self.stream = None
+        self.local = None
+        self.lock = Lock()
+
+    def connect(self):
+        """
+        Connects to the daemon, if it hasn't been already.
+        """
+        if self.stream is None:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                client.connect(self.path)
+            except OSError:
+                client.close()
+                raise
+            self.stream = client.makefile("rwb")
+            client.close()
+
+    def disconnect(self):
+        """
+        Closes the connection to the daemon, if open.
+        """
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def call(self, method, *args):
+        """
+        Calls a storage method in the daemon, and returns its result.
+
+        A LookupError in the daemon is raised here too.
+        Any other failure in the daemon is raised as a RuntimeError.
+        """
+        with self.lock:
+            if self.local is None:
+                try:
+                    return self.request(method, args)
+                except (OSError, ValueError):
+                    # The daemon is down (or not speaking JSON),
+                    # so this session stores its own saves from now on.
+                    self.disconnect()
+                    self.local = self.fallback()
+            return getattr(self.local, method)(*args)
+
+    def request(self, method, args):
+        """
+        Sends one request to the daemon, and returns the result.
+        """
+        self.connect()
+        request = {"method": method, "args": list(args)}
+        self.stream.write(json.dumps(request).encode() + b"\n")
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("The save daemon closed the connection.")
+        response = json.loads(line)
+        if "error" not in response:
+            return response["result"]
+        if response["error"] == "LookupError":
+            raise LookupError(response["message"])
+        # Not an OSError, so that a failure inside the daemon
+        # isn't taken for the daemon being unreachable.
+        raise RuntimeError(response["message"])
+
+    def warm(self):
+        """
+        Asks the daemon to warm its storage, if it hasn't already.
+        """
+        self.call("warm")
+
+    def exists(self, name):
+        """
+        Returns true if name has a savegame.
+        """
+        return self.call("exists", name)
+
+    def create(self, values):
+        """
+        Creates a savegame holding values.
+        """
+        self.call("create", values)
+
+    def read(self, name, width=None):
+        """
+        Returns the values of name.
+        """
+        return self.call("read", name, width)
+
+    def write(self, name, values):
+        """
+        Writes values for name.
+        """
+        self.call("write", name, values)
+
+    def close(self, timeout=10):
+        """
+        Closes the connection. The daemon keeps sending queued saves.
+
+        If this session fell back to local storage, that is closed too.
+        """
+        with self.lock:
+            self.disconnect()
+            if self.local is not None:
+                return self.local.close(timeout)
+        return True
+
+
+def base_backend(storage):
+    """
+    Returns the backend at the bottom of a stack of storage wrappers.
+    """
+    while hasattr(storage, "backend"):
+        storage = storage.backend
+    return storage
+
+
+def prepare_fork(storage):
+    """
+    Readies storage to be shared by game sessions forked from this process.
+
+    With the Sheets backend, this authorizes and connects to the worksheet
+    now, in this thread, so every session forked afterwards starts
+    connected. No threads are started, as they wouldn't survive a fork.
+    """
+    backend = base_backend(storage)
+    if isinstance(backend, SheetsStorage):
+        backend.worksheet()
+
+
+def after_fork(storage):
+    """
+    Gives a forked game session its own connections.
+
+    Sockets inherited from the parent process would be shared with it
+    (and with every other session), so they're dropped, and new ones
+    are opened when next needed. The Sheets client keeps its credentials.
+    """
+    backend = base_backend(storage)
+    if isinstance(backend, SheetsStorage) and backend.saves is not None:
+        backend.saves.client.session.close()
+    elif isinstance(backend, SQLiteStorage):
+        backend.connection = None
+    elif isinstance(backend, DaemonStorage):
+        backend.disconnect()
+
+
+def should_retry(error, idempotent=True):
+    """
+    Returns true if a failed request to the Sheets API is worth retrying.
+
+    Network errors are retried, as are API errors with RETRY_STATUSES.
+    Nothing else is. A request that isn't idempotent may have been
+    applied despite a network or server error, so it's only retried
+    when rejected for quota reasons (429), as it then wasn't applied.
+    """
+    # gspread is only imported once a request has been made with it.
+    from gspread.exceptions import APIError
+    if isinstance(error, APIError):
+        status = error.response.status_code
+        if not idempotent:
+            return status == 429
+        return status in RETRY_STATUSES
+    return idempotent and isinstance(error, OSError)
+
+
+def same_value(old_value, new_value):
+    """
+    Returns true if a stored value is the same as a value being saved.
+
+    The sheet returns every value as a string, and may show a float
+    like 2.0 as "2", so numbers are compared by value rather than as text.
+    """
+    try:
+        return float(old_value) == float(new_value)
+    except (TypeError, ValueError):
+        return str(old_value) == str(new_value)
+
+
+def row_changes(old_row, new_row):
+    """
+    Returns the values of new_row that differ from old_row, by position.
+
+    Positions past the end of old_row always count as changed.
+    """
+    return {
+        position: value
+        for position, value in enumerate(new_row)
+        if position >= len(old_row)
+        or not same_value(old_row[position], value)
+        }
+
+
+def position_runs(changes):
+    """
+    Yields (first, last) pairs of neighbouring positions in changes.
+
+    For example, positions 2, 3, 4 and 7 give (2, 4) and (7, 7).
+    """
+    positions = sorted(changes)
+    first = last = positions[0]
+    for position in positions[1:]:
+        if position != last + 1:
+            yield first, last
+            first = position
+        last = position
+    yield first, last
+
+
+def open_backend():
+    """
+    Returns the savegame backend named by the SAVE_BACKEND variable.
+
+    SAVE_BACKEND may be "sheets" (the default) or "sqlite".
+    The Sheets request quota is read from SHEETS_REQUESTS_PER_MINUTE
+    (default 60, the Sheets API limit per user per minute).
+    Google access tokens are cached in the file at SHEETS_TOKEN_CACHE
+    (default ".sheets-token.json"). If it's set but empty, they aren't.
+    The SQLite database path is read from SAVE_DB (default "savegames.db").
+    """
+    backend = os.environ.get("SAVE_BACKEND", "sheets")
+    if backend == "sheets":
+        per_minute = int(os.environ.get("SHEETS_REQUESTS_PER_MINUTE", 60))
+        cache_path = os.environ.get("SHEETS_TOKEN_CACHE", ".sheets-token.json")
+        return SheetsStorage(
+            RequestScheduler(per_minute),
+            token_cache=TokenCache(cache_path) if cache_path else None)
+    if backend == "sqlite":
+        return SQLiteStorage(os.environ.get("SAVE_DB", "savegames.db"))
+    raise ValueError(f"Unknown SAVE_BACKEND: {backend}")
+
+
+def open_storage():
+    """
+    Returns the savegame storage used by the game.
+
+    If SAVE_DAEMON_SOCKET is set, this passes requests to the save daemon
+    listening there. Otherwise, it is open_local_storage().
+    """
+    daemon_path = os.environ.get("SAVE_DAEMON_SOCKET")
+    if daemon_path:
+        return DaemonStorage(daemon_path, open_local_storage)
+    return open_local_storage()
+
+
+def open_local_storage():
+    """
+    Returns a savegame storage stack owned by this process.
+
+    This is the backend from open_backend(), sending only changed values,
+    behind the journal at the path in SAVE_JOURNAL
+    (default "savegames.journal"). If SAVE_JOURNAL is set but empty,
+    an in-memory write-behind queue is used instead.
+    """
+    backend = DeltaStorage(open_backend())
+    journal_path = os.environ.get("SAVE_JOURNAL", "savegames.journal")
+    if journal_path:
+        return JournalStorage(backend, SaveJournal(journal_path))
+    return WriteBehindStorage(backend)
@@ -0,0 +1,471 @@
+"""
+The story of "Double Agent", played from a scene graph.
+
+The story itself is data, kept in story.json: a graph of nodes,
+each holding what happens at one point in the story.
+A node has a list of "actions", done in order, and then either:
+  "choice": options for the player, whose answer is kept in scene
+  variable "var", before going on to "next";
+  "branch": a list of {"if": condition, "next": node} tried in order,
+  the last of which has no "if", and is taken when nothing else is;
+  or "next": the node that follows, or null where the story ends.
+
+Actions are lists, starting with their kind:
+  ["say", text]: text is printed, then the reader is given time to read it;
+  ["print", text]: text is printed at once;
+  ["pause"], ["decoration"], ["save"]: as run.py's functions of that name;
+  ["add", key, n]: n is added to a value of the "game" dictionary;
+  ["set", key, value]: a value of the "game" dictionary is set;
+  ["var", name, value]: a scene variable is set.
+Texts may name values of "game" in braces, e.g. "{name}".
+
+Conditions test a value of "game" ({"key": key}) or a scene variable
+({"var": name}), which is true if it is, or compare it, with "op"
+("==" or "!=") and "value". They combine with {"not": condition},
+{"all": [conditions]} and {"any": [conditions]}.
+
+"checkpoints" names the node each checkpoint starts from, in order.
+Each begins a chapter: the nodes named after it, e.g. "first_morning.3".
+Scene variables (the player's answers, and so on) are not saved,
+so each checkpoint starts a scene that does not depend on the one before.
+
+The game doesn't play story.json itself, but a compiled copy, cached
+on disk (see open_story()). There, nodes are numbered chapter by chapter,
+and each node is a flat tuple (see compile_node()). Only the chapter
+a game resumes from is loaded at first; others are loaded as it reaches them.
+
+The engine knows nothing of the terminal: run.py prints what it is told.
+Tools can play the story with step(), which changes nothing it is given.
+"""
+
+import json
+import marshal
+import os
+import struct
+import sys
+from bisect import bisect_right
+
+# The story played by run.py, kept next to this file.
+STORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "story.json")
+
+# Identifies a story cache, and the layout and Python version it was
+# written for (marshal's format can change between versions).
+CACHE_MAGIC = b"DASTORY1"
+CACHE_VERSION = (2, sys.version_info[:2], marshal.version)
+
+
+class Story:
+    """
+    A compiled story, whose chapters are loaded as they are needed.
+
+    "checkpoints" holds the first node of each chapter ("scenes" holds
+    the same, as a set), "scene_names" the names of those nodes,
+    and "nodes" every node, by number (None for those not loaded yet).
+    Chapters are read from the cache file, given as an open descriptor,
+    where index says where each one is.
+    """
+
+    def __init__(self, scene_names, checkpoints, size, descriptor=None,
+                 index=()):
+        self.scene_names = scene_names
+        self.checkpoints = checkpoints
+        self.scenes = frozenset(checkpoints)
+        self.nodes = [None] * size
+        self.descriptor = descriptor
+        self.index = index
+
+    def add_chapter(self, chapter, nodes):
+        """
+        Places the nodes of a chapter (a list of node tuples).
+        """
+        first = self.checkpoints[chapter]
+        self.nodes[first:first + len(nodes)] = nodes
+
+    def load_chapter(self, chapter):
+        """
+        Reads a chapter from the cache file.
+
+        os.pread() is used so that processes forked from the one that
+        opened the cache (e.g. by the zygote) can't move each other's
+        file offset.
+        """
+        offset, length = self.index[chapter]
+        data = os.pread(self.descriptor, length, offset)
+        self.add_chapter(chapter, marshal.loads(data))
+
+    def node(self, node_id):
+        """
+        Returns a node, loading its chapter first if need be.
+        """
+        node = self.nodes[node_id]
+        if node is None:
+            self.load_chapter(bisect_right(self.checkpoints, node_id) - 1)
+            node = self.nodes[node_id]
+        return node
+
+    def load_all(self):
+        """
+        Loads every chapter, for tools that look at the whole story.
+        """
+        for chapter, first in enumerate(self.checkpoints):
+            if self.nodes[first] is None:
+                self.load_chapter(chapter)
+        return self
+
+
+def load_story(path=STORY_PATH):
+    """
+    Returns the story held in the JSON file at path.
+    """
+    with open(path, encoding="utf-8") as story_file:
+        return json.load(story_file)
+
+
+def compile_story(source):
+    """
+    Returns the scene names, checkpoints and chapters of a JSON story.
+
+    Nodes are numbered chapter by chapter, each chapter's scene first.
+    Each chapter is a list of node tuples (see compile_node()).
+    Strings are interned, so each is held (and cached) once.
+    """
+    scenes = source["checkpoints"]
+
+    def chapter_of(name):
+        return scenes.index(name.split(".")[0])
+
+    names = sorted(source["nodes"],
+                   key=lambda name: (chapter_of(name), name not in scenes))
+    numbers = {name: number for number, name in enumerate(names)}
+    chapters = [[] for _ in scenes]
+    for name in names:
+        node = compile_node(source["nodes"][name], numbers)
+        chapters[chapter_of(name)].append(node)
+    checkpoints = tuple(numbers[scene] for scene in scenes)
+    return tuple(intern(scene) for scene in scenes), checkpoints, chapters
+
+
+def compile_node(node, numbers):
+    """
+    Returns a node of the JSON story as a tuple for the engine.
+
+    The tuple is (actions, options, var, branches, next):
+    options and var are those of a choice (None if there's none),
+    branches is a tuple of (condition, node) pairs, tried in order,
+    and next is the node that follows if none of them is taken.
+    """
+    def number(name):
+        return None if name is None else numbers[name]
+
+    actions = tuple(tuple(intern(part) for part in action)
+                    for action in node.get("actions", ()))
+    options = var = None
+    if "choice" in node:
+        options = tuple(intern(option) for option in node["choice"])
+        var = intern(node["var"])
+    branches = ()
+    following = number(node.get("next"))
+    if "branch" in node:
+        branches = tuple((compile_condition(branch["if"]),
+                          number(branch["next"]))
+                         for branch in node["branch"] if "if" in branch)
+        following = number(node["branch"][-1]["next"])
+    return (actions, options, var, branches, following)
+
+
+def compile_condition(condition):
+    """
+    Returns a condition of the JSON story as a tuple for the engine.
+
+    That is ("not", condition), ("all", conditions), ("any", conditions),
+    or ("key" or "var", name, op, value), where op may be None.
+    """
+    for kind in ("all", "any"):
+        if kind in condition:
+            return (kind, tuple(compile_condition(part)
+                                for part in condition[kind]))
+    if "not" in condition:
+        return ("not", compile_condition(condition["not"]))
+    kind = "key" if "key" in condition else "var"
+    return (kind, intern(condition[kind]), condition.get("op"),
+            intern(condition.get("value")))
+
+
+def intern(value):
+    """
+    Returns value, interned if it's a string.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def open_story(path=STORY_PATH, cache_path=None):
+    """
+    Returns the compiled story, without loading any of its chapters.
+
+    The cache (STORY_CACHE, by default story.cache next to the story)
+    records the size and modification time of the story it was compiled
+    from. If the story has changed since, or the cache is missing or
+    unreadable, the story is compiled again and a new cache is written.
+    It's written under a temporary name, then moved into place,
+    as other processes may be doing the same.
+    If the cache can't be written, the compiled story is still returned,
+    with every chapter loaded.
+    """
+    if cache_path is None:
+        cache_path = os.environ.get(
+            "STORY_CACHE", os.path.splitext(path)[0] + ".cache")
+    source = os.stat(path)
+    stamp = (source.st_mtime_ns, source.st_size)
+    try:
+        return read_cache(cache_path, stamp)
+    except (OSError, ValueError, EOFError, TypeError, struct.error):
+        pass
+    scene_names, checkpoints, chapters = compile_story(load_story(path))
+    try:
+        write_cache(cache_path, stamp, scene_names, checkpoints, chapters)
+    except OSError:
+        pass
+    story = Story(scene_names, checkpoints,
+                  sum(len(nodes) for nodes in chapters))
+    for chapter, nodes in enumerate(chapters):
+        story.add_chapter(chapter, nodes)
+    return story
+
+
+def read_cache(cache_path, stamp):
+    """
+    Opens the story cache, checking that it matches the story's stamp.
+
+    Raises ValueError if it doesn't, or if it isn't a whole story cache.
+    The cache stays open, for its chapters to be read from.
+    """
+    descriptor = os.open(cache_path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        start = len(CACHE_MAGIC) + 4
+        prefix = os.pread(descriptor, start, 0)
+        if prefix[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+            raise ValueError("Not a story cache.")
+        length = struct.unpack("<I", prefix[len(CACHE_MAGIC):])[0]
+        header = marshal.loads(os.pread(descriptor, length, start))
+        version, cached_stamp, scene_names, checkpoints, size, index = header
+        if version != CACHE_VERSION or cached_stamp != stamp:
+            raise ValueError("The story cache is out of date.")
+        start += length
+        end = start + sum(count for _, count in index)
+        if os.fstat(descriptor).st_size != end:
+            raise ValueError("The story cache is incomplete.")
+    except BaseException:
+        os.close(descriptor)
+        raise
+    index = tuple((start + offset, count) for offset, count in index)
+    return Story(scene_names, checkpoints, size, descriptor, index)
+
+
+def write_cache(cache_path, stamp, scene_names, checkpoints, chapters):
+    """
+    Writes the compiled story to its cache.
+
+    The cache holds a header (scenes, checkpoints, size, and where each
+    chapter is, after the header), then each chapter, marshalled separately
+    so that it can be loaded on its own.
+    """
+    blobs = [marshal.dumps(nodes) for nodes in chapters]
+    index = []
+    offset = 0
+    for blob in blobs:
+        index.append((offset, len(blob)))
+        offset += len(blob)
+    size = sum(len(nodes) for nodes in chapters)
+    header = marshal.dumps(
+        (CACHE_VERSION, stamp, scene_names, checkpoints, size,
+         tuple(index)))
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as cache_file:
+        cache_file.write(CACHE_MAGIC + struct.pack("<I", len(header)))
+        cache_file.write(header)
+        for blob in blobs:
+            cache_file.write(blob)
+    os.replace(temp_path, cache_path)
+
+
+def live_vars(story):
+    """
+    Returns, for each node, the scene variables still to be read there.
+
+    That is, after the node's actions: its conditions, or those of
+    the nodes that may follow, may read them before they're set again.
+    Two states at a node play out alike if their "game" dictionaries and
+    these variables match, so tools compare only these.
+    The story must be fully loaded.
+    """
+    def reads(condition):
+        if condition[0] in ("all", "any"):
+            return frozenset().union(*map(reads, condition[1]))
+        if condition[0] == "not":
+            return reads(condition[1])
+        if condition[0] == "var":
+            return frozenset([condition[1]])
+        return frozenset()
+
+    def live_in(node_id):
+        # Scene variables are cleared as each scene begins.
+        if node_id is None or node_id in story.scenes:
+            return frozenset()
+        actions = story.nodes[node_id][0]
+        sets = {action[1] for action in actions if action[0] == "var"}
+        return after[node_id] - sets
+
+    after = [frozenset()] * len(story.nodes)
+    changed = True
+    while changed:
+        changed = False
+        for node_id in reversed(range(len(story.nodes))):
+            _, _, var, branches, following = story.nodes[node_id]
+            live = live_in(following) - {var}
+            for condition, target in branches:
+                live |= reads(condition) | live_in(target)
+            if live != after[node_id]:
+                after[node_id] = live
+                changed = True
+    return after
+
+
+def checkpoint_node(story, checkpoint):
+    """
+    Returns the node a game resumes from, at the given checkpoint.
+
+    Unknown checkpoints (including 0, a new game) begin the story.
+    """
+    if 0 < checkpoint < len(story.checkpoints):
+        return story.checkpoints[checkpoint]
+    return story.checkpoints[0]
+
+
+def options(story, node_id):
+    """
+    Returns the options of the choice at node_id.
+    """
+    return story.node(node_id)[1]
+
+
+def inc_game_value(game, key_name, value):
+    """
+    Increments a named key from game dictionary by value.
+
+    If "under_duress" is true (i.e. greater than zero),
+    "trust_pref" can only be decreased, not increased.
+    (If you're spying because the Prefect threatened to kill you,
+    events can decrease her trust, but never increase it.)
+    """
+    run_function = True
+    if key_name == "trust_pref" and value > 0 and game["under_duress"]:
+        run_function = False
+    if run_function:
+        game[key_name] = game.get(key_name) + value
+
+
+def test(condition, game, scene_vars):
+    """
+    Returns whether a compiled condition holds for game and scene_vars.
+    """
+    kind = condition[0]
+    if kind == "not":
+        return not test(condition[1], game, scene_vars)
+    if kind == "all":
+        return all(test(part, game, scene_vars) for part in condition[1])
+    if kind == "any":
+        return any(test(part, game, scene_vars) for part in condition[1])
+    _, name, operator, expected = condition
+    if kind == "key":
+        value = game[name]
+    else:
+        value = scene_vars.get(name)
+    if operator == "==":
+        return value == expected
+    if operator == "!=":
+        return value != expected
+    return bool(value)
+
+
+def apply(action, game, scene_vars):
+    """
+    Does what action does to game or scene_vars.
+
+    Returns the output action, with its text filled in, or None.
+    """
+    kind = action[0]
+    if kind == "add":
+        inc_game_value(game, action[1], action[2])
+    elif kind == "set":
+        game[action[1]] = action[2]
+    elif kind == "var":
+        scene_vars[action[1]] = action[2]
+    elif len(action) > 1:
+        return (kind, action[1].format_map(game))
+    else:
+        return action
+    return None
+
+
+def run(story, node_id, game, scene_vars, perform=None, stops=()):
+    """
+    Plays the story from node_id, up to the next choice.
+
+    Each output action (e.g. ("say", text)) is passed to perform, in turn.
+    Returns the node of the choice, or None if the story ends first.
+    If one of stops (e.g. a checkpoint) is reached, the story stops there
+    instead, before that node, and it is returned.
+    Scene variables are cleared as each checkpoint's scene begins.
+    """
+    while node_id is not None:
+        if node_id in stops:
+            return node_id
+        if node_id in story.scenes:
+            scene_vars.clear()
+        actions, choice, _, branches, following = story.node(node_id)
+        for action in actions:
+            output = apply(action, game, scene_vars)
+            if output and perform:
+                perform(output)
+        if choice:
+            return node_id
+        node_id = following
+        for condition, target in branches:
+            if test(condition, game, scene_vars):
+                node_id = target
+                break
+    return None
+
+
+def choose(story, node_id, answer, scene_vars):
+    """
+    Records answer ("1", "2", ...) to the choice at node_id.
+
+    Returns the node the story goes on from.
+    """
+    _, _, var, _, following = story.node(node_id)
+    scene_vars[var] = answer
+    return following
+
+
+def step(story, state, answer=None, stops=()):
+    """
+    Returns the state after answering the choice at state, and its output.
+
+    A state is a dictionary of "node", "game" and "vars" (scene variables).
+    The story is run on to the next choice (or one of stops, as in run()),
+    which becomes the new "node" (None if the story ends).
+    The given state is left unchanged.
+    Without an answer, the story is run from state's node instead,
+    e.g. to start it: step(story, {"node": checkpoint_node(story, 0), ...}).
+    Output is a list of output actions, e.g. [("say", text), ("pause",)].
+    """
+    game = dict(state["game"])
+    scene_vars = dict(state["vars"])
+    node_id = state["node"]
+    if answer is not None:
+        node_id = choose(story, node_id, answer, scene_vars)
+    output = []
+    node_id = run(story, node_id, game, scene_vars, output.append, stops)
+    return {"node": node_id, "game": game, "vars": scene_vars}, output
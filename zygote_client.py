@@ -0,0 +1,84 @@
+"""
+Starts a game session through the zygote (run.py --zygote).
+
+Run with "python3 -S zygote_client.py", in place of "python3 run.py".
+This only imports a few small modules, so it starts quickly. It passes
+its terminal, working directory and environment to the zygote, which
+forks a game that is already loaded. Signals sent to this process
+are passed on to the game, and it exits with the game's exit status.
+If no zygote is listening, or it closes the connection before starting
+a game, the game is run directly instead.
+The zygote's socket path is read from ZYGOTE_SOCKET (default "zygote.sock").
+Settings read when run.py is imported (HEADLESS, SAVE_FORMAT and the
+savegame storage variables, such as SAVE_BACKEND) are those the zygote
+was started with: any set only for this session are ignored.
+"""
+
+import fcntl
+import json
+import os
+import signal
+import socket
+import sys
+import termios
+
+
+def run_directly():
+    """
+    Replaces this process with the game, run without the zygote.
+    """
+    os.execv(sys.executable, [sys.executable, "run.py"])
+
+
+def forward_signals(pid):
+    """
+    Passes the signals that end a game on to the game with pid.
+    """
+    def forward(signum, frame):  # pylint: disable=unused-argument
+        os.kill(pid, signum)
+
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, forward)
+
+
+def main():
+    """
+    Connects to the zygote, hands over the terminal and waits for the game.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(os.environ.get("ZYGOTE_SOCKET", "zygote.sock"))
+    except OSError:
+        run_directly()
+    settings = {"cwd": os.getcwd(), "env": dict(os.environ)}
+    # The terminal is given up, so the game can make it its own.
+    # Giving it up sends SIGHUP to this process, which is ignored.
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    try:
+        fcntl.ioctl(0, termios.TIOCNOTTY)
+    except OSError:
+        pass
+    message = json.dumps(settings).encode() + b"\n"
+    socket.send_fds(client, [message], [0, 1, 2])
+    replies = client.makefile("rb")
+    try:
+        pid = int(replies.readline())
+    except (OSError, ValueError):
+        # The zygote closed the connection (e.g. it was stopped)
+        # without starting a game, so none is running yet.
+        # The terminal is taken back first, so the game has it for
+        # getpass(). This process is still its session's leader,
+        # and nothing else has taken the terminal.
+        client.close()
+        try:
+            fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+        except OSError:
+            pass
+        run_directly()
+    forward_signals(pid)
+    status = replies.readline()
+    sys.exit(int(status) if status else 1)
+
+
+if __name__ == "__main__":
+    main()